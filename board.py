@@ -1,24 +1,28 @@
 from pyb import Pin, ExtInt, ADC, Timer,  delay
 from pyb import disable_irq, enable_irq
 from math import fabs, modf, trunc
+from time import ticks_ms, ticks_us, ticks_diff, ticks_add
 from machine import I2C
 from ssd1306 import SSD1306_I2C
 from writer import Writer
 import freesans20, font10
 import micropython
+from micropython import const
 from speed import Speed
 
 class Button(object):
+    DEBOUNCE = const(500) # ms, edges closer to the last press are bounces
     def __init__(self):
-        self.extint = ExtInt(Pin('ON/OFF'), ExtInt.IRQ_FALLING, Pin.PULL_UP, self.__callback__)
         self._status = False
+        self._last = ticks_add(ticks_ms(), -self.DEBOUNCE)
+        self.extint = ExtInt(Pin('ON/OFF'), ExtInt.IRQ_FALLING, Pin.PULL_UP, self.__callback__)
         
     def __callback__(self, line):
-        #print('1, button __callback__', line)
-        self.extint.disable()
-        delay(500)
-        self._status = False if self._status else True
-        self.extint.enable()
+        # debounced by time, the ISR never waits
+        now = ticks_ms()
+        if ticks_diff(now, self._last) < self.DEBOUNCE: return
+        self._last = now
+        self._status = not self._status
 
     def reset(self):
         irq_state = disable_irq()
@@ -30,17 +34,25 @@ class Button(object):
         return True if self._status else False
 
 class Buzzer(object):
+    QUEUE = const(4) # patterns waiting for the player
     def __init__(self):
         self.pin = Pin('Buzzer')
         self.pin.high()
+        self.player = False # a task plays the patterns, beeps return at once
+        self.patterns = [] # (span, count, gap) waiting for the player, oldest first
         
-    def beep(self, span=100): # milisecons
-        self.pin.low()
-        delay(span)
-        self.pin.high()
+    def beep(self, span=100, count=1, gap=0): # milisecons
+        if self.player:
+            if len(self.patterns) < self.QUEUE: self.patterns.append((span, count, gap))
+            return
+        for n in range(count):
+            self.pin.low()
+            delay(span)
+            self.pin.high()
+            delay(gap)
 
     def tbeep(self, span=100):
-        for n in range(3): self.beep(span); delay(1000)
+        self.beep(span, 3, 1000)
 
     def silent(self):
         self.pin.high()
@@ -114,20 +126,55 @@ class RGBLed(object):
         for pin in self.active:
             pin.off() if pin.value() else pin.on()
 
+class Region(object):
+    # rectangular area of the screen that remembers its last rendered text
+    def __init__(self, screen, x, y, w, h):
+        self.screen = screen
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.text = None
+
+    def reset(self):
+        self.text = None
+
+    def update(self, wrt, row, col, text):
+        if text == self.text: return False
+        self.screen.fill_rect(self.x, self.y, self.w, self.h, 0)
+        wrt.set_textpos(self.screen, row, col)
+        wrt.printstring(text)
+        self.text = text
+        return True
+
 class Display(object):
-    def __init__(self):
-        self.i2c = I2C(scl=Pin('SCL'), sda=Pin('SDA'))
+    I2C_BUS = const(1) # SCL/SDA are wired to hardware I2C(1) pins B6/B7
+    I2C_FREQ = const(400000) # fast mode, SSD1306 usually copes with 1 MHz too
+    def __init__(self, freq=I2C_FREQ, soft=False):
+        if soft: # bit-banged bus on the same pins
+            try: from machine import SoftI2C
+            except ImportError: SoftI2C = I2C # older firmware: pin-based I2C is the soft one
+            self.i2c = SoftI2C(scl=Pin('SCL'), sda=Pin('SDA'), freq=freq)
+        else:
+            self.i2c = I2C(self.I2C_BUS, freq=freq)
+        self.transfer_us = 0     # last frame transfer time
+        self.transfer_max_us = 0 # worst frame transfer time
         self.screen = SSD1306_I2C(128, 64, self.i2c)
         self.wrt = Writer(self.screen, freesans20, False),\
                    Writer(self.screen, font10, False)
         self._msg_ = 'Iniciando'
         self._data_ = None
+        self.changed = True # new msg/data not rendered yet
+        # data layout: speed on top, distance bottom left, duration bottom right
+        self._chrome = False # grid lines drawn
+        self._shown_msg = None
+        self.regions = { 'speed': Region(self.screen, 0, 0, 128, 32),
+                         'distance': Region(self.screen, 0, 33, 68, 31),
+                         'duration': Region(self.screen, 69, 33, 59, 31) }
 
         
     def set_msg(self, msg):
         irq_state = disable_irq()
         self._data_ = None
         self._msg_ = msg
+        self.changed = True
         enable_irq(irq_state)
         #print('msg=',self._msg_)
 
@@ -135,49 +182,66 @@ class Display(object):
         irq_state = disable_irq()
         self._msg_ = None
         self._data_ = data
+        self.changed = True
         enable_irq(irq_state)
         #print('data=', self._data_)
     
     def show_msg(self):
         if self._msg_ is None: return
+        self.changed = False
+        if self._msg_ == self._shown_msg: return
         self.screen.fill(0)
         self.wrt[0].set_textpos(self.screen, 10, 0)
         self.wrt[0].printstring(self._msg_)
+        self._transfer()
+        self._shown_msg = self._msg_
+        self._chrome = False
+
+    def _transfer(self):
+        start = ticks_us()
         self.screen.show()
+        self.transfer_us = ticks_diff(ticks_us(), start)
+        if self.transfer_us > self.transfer_max_us: self.transfer_max_us = self.transfer_us
+
+    def _draw_chrome(self):
+        self.screen.fill(0)
+        self.screen.hline(0, 32, 128, 2)
+        self.screen.vline(68, 32, 32, 2)
+        for region in self.regions.values(): region.reset()
+        self._chrome = True
+        self._shown_msg = None
         
     def show_data(self):
         if self._data_ is None: return
 #        print(self._data_)
         speed, distance, duration = self._data_
-        self.screen.fill(0)
-        self.screen.hline(0, 32, 128, 2)
-        self.screen.vline(68, 32, 32, 2)
+        self.changed = False
+        if not self._chrome: self._draw_chrome()
     
         wpos = 10 if speed.ref >= 10 else 20
-        self.wrt[0].set_textpos(self.screen, 5, wpos)
         if fabs(speed.delta) > 0.2:
             spd_msg = '[{0:.1f}] < {1:.1f}'.format(speed.ref, speed.act)
         else:
             spd_msg = '{:.1f} Km/h'.format(speed.ref)
-        self.wrt[0].printstring(spd_msg)        
+        self.regions['speed'].update(self.wrt[0], 5, wpos, spd_msg)
 
         km, m = divmod(int(distance),1000)
         dst_msg = '{:.1f} Km'.format(trunc(distance/100)/10) if km > 0 else '{:3d} m'.format(m)
         wrt = self.wrt[1] if km >= 10 else self.wrt[0]
-        wrt.set_textpos(self.screen, 43 if km >= 10 else 40, 4)
-        wrt.printstring(dst_msg)
+        self.regions['distance'].update(wrt, 43 if km >= 10 else 40, 4, dst_msg)
         
-        self.wrt[0].set_textpos(self.screen, 40, 75)
         h,s = divmod(int(duration),3600) # horas
         m,s = divmod(s,60) # minutos
         H,h = divmod(h, 10) # decenas de horas
-        if H > 0: self.wrt[0].printstring('{:2d}:{:02d}'.format(h,m))
+        if H > 0: drt_msg = '{:2d}:{:02d}'.format(h,m)
         else:
-            self.wrt[0].printstring('{:02d}:{:02d}'.format(m,s) if h == 0 else '{:1d}h:{:02d}'.format(h,m))
+            drt_msg = '{:02d}:{:02d}'.format(m,s) if h == 0 else '{:1d}h:{:02d}'.format(h,m)
+        self.regions['duration'].update(self.wrt[0], 40, 75, drt_msg)
 
-        self.screen.show()
+        self._transfer()
         
 class Board(object):
+    REFRESH_FPS = const(4) # display frames per second when refreshed off a timer
     def __init__(self, speed_mngr, slope_mngr):
         self.switch = Button()
         self.buzzer = Buzzer()
@@ -186,15 +250,69 @@ class Board(object):
         self.speed_meter = speed_mngr.meter
         self.speed_leader = speed_mngr.leader
         self.slope_leader = slope_mngr.leader
-#        self._timer = Timer(1, freq=1)
-#        self._timer.callback(self.callback)
-        
-#    def callback(self, t):
-#        micropython.schedule(self.show,0)
+        self._timer = None
+        self._refresh_ref = self._refresh # bound once: no allocation in the ISR
+        self._pending = False # frame scheduled but not rendered yet
+        self._showing = False
+        self._period = 0
+        self._last_frame = None
+        self.frames = 0  # rendered frames
+        self.skipped = 0 # frames skipped, nothing changed
+        self.dropped = 0 # frames lost, previous one still pending
+        self.late = 0    # frames rendered later than 1.5 periods
+
+    def refresh(self, fps=REFRESH_FPS, timer=True):
+        # render the display off Timer(1) at fps frames/second, fps=0 stops it;
+        # timer=False leaves calling update() every 1000 // fps ms to a task
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+        self._period = 1000 // fps if fps else 0
+        self._last_frame = None
+        if not fps or not timer: return
+        self._timer = Timer(1, freq=fps)
+        self._timer.callback(self.callback)
+
+    def callback(self, t):
+        if self._pending:
+            self.dropped += 1
+            return
+        self._pending = True
+        try:
+            micropython.schedule(self._refresh_ref, 0)
+        except RuntimeError: # schedule queue full
+            self._pending = False
+            self.dropped += 1
+
+    def _refresh(self, _):
+        self._pending = False
+        self.update()
+
+    def update(self):
+        # one refresh period: render if anything changed
+        now = ticks_ms()
+        if self._last_frame is not None and \
+           ticks_diff(now, self._last_frame) > self._period * 3 // 2:
+            self.late += 1
+        self._last_frame = now
+        if not self.display.changed:
+            self.skipped += 1
+            return
+        self.show()
+        self.frames += 1
+
+    @property
+    def frame_stats(self):
+        return self.frames, self.skipped, self.dropped, self.late
 
     def show(self):
-        self.display.show_msg()
-        self.display.show_data()
+        if self._showing: return # a scheduled refresh landed inside a render
+        self._showing = True
+        try:
+            self.display.show_msg()
+            self.display.show_data()
+        finally:
+            self._showing = False
             
     def start(self):
         self.led.yellow()
@@ -215,10 +333,13 @@ class Board(object):
     def isOn(self):
         return True if self.switch.on() else False
 
-    def running(self):
+    def data(self):
         speed = Speed(self.speed_leader.speed, self.speed_meter.speed)
         self.display.set_data((speed, self.speed_meter.distance, self.speed_meter.duration))
-        self.show()
+
+    def running(self):
+        self.data()
+        if not self._period: self.show() # otherwise rendered by refresh()
         
     def setOn(self):
         self.display.set_msg('Iniciando!!')
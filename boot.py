@@ -5,3 +5,4 @@ import pyb
 #pyb.main('main.py') # main script to run after this one
 #pyb.usb_mode('CDC+MSC') # act as a serial and a storage device
 #pyb.usb_mode('CDC+HID') # act as a serial device and a mouse
+#pyb.usb_mode('VCP+VCP') # second serial port for telemetry (main.TELEMETRY_PORT = 1)
@@ -0,0 +1,101 @@
+from pyb import Pin, delay
+from time import ticks_ms, ticks_diff
+from micropython import const
+try: import ujson as json
+except ImportError: import json
+
+# Calibration: measures the constants the controllers depend on and keeps
+# them in a small file on flash, loaded at boot.
+#   step      meters per speed pulse           (SpeedMeter.STEP)
+#   gain_up   km/h gained per ms of SPD+       (SpeedController)
+#   gain_down km/h lost per ms of SPD-         (SpeedController)
+#   t_up      ms to raise the slope full range (SlopeController.SLOPE_TMAX)
+#   t_down    ms to lower it full range        (SlopeController.SLOPE_TDOWN)
+# Holding the start/stop button while booting runs the calibration.
+
+FILE = 'calib.json'
+BELT_LENGTH = 2.60 # meters, measured once along the belt
+BELT_LAPS = const(5) # belt laps counted to measure the step
+CAL_PULSE = const(2000) # ms of SPD+/SPD- used to measure speed gains
+SETTLE = const(4000) # ms for the belt speed to settle after a pulse
+TIMEOUT = const(60000) # ms waiting for the button
+
+def load():
+    try:
+        with open(FILE) as f: return json.load(f)
+    except (OSError, ValueError): # no calibration yet or damaged file
+        return {}
+
+def save(calib):
+    with open(FILE, 'w') as f: json.dump(calib, f)
+
+def requested():
+    return Pin('ON/OFF').value() == 0 # button pressed (pulled up)
+
+def _wait_button(board, timeout=TIMEOUT):
+    # ms until the start/stop button is pressed, None on timeout
+    board.switch.reset()
+    start = ticks_ms()
+    while not board.isOn():
+        if ticks_diff(ticks_ms(), start) > timeout: return None
+        delay(10)
+    return ticks_diff(ticks_ms(), start)
+
+def _message(board, msg):
+    board.display.set_msg(msg)
+    board.show()
+    board.buzzer.beep()
+
+def _travel(board, pin, msg):
+    # run the slope motor until the button marks the end of its travel
+    _message(board, msg)
+    Pin(pin).on()
+    elapsed = _wait_button(board)
+    Pin(pin).off()
+    return elapsed
+
+def _pulse(pin, width):
+    Pin(pin).on()
+    delay(width)
+    Pin(pin).off()
+    delay(SETTLE)
+
+def calibrate_slope(board, slp_mngr, calib):
+    _message(board, 'Calibrar\ninclinacion')
+    cntrl = slp_mngr.cntrl # start from horizontal
+    Pin('INC-').on(); delay(cntrl.t_down + cntrl.END_MARGIN); Pin('INC-').off()
+    t_up = _travel(board, 'INC+', 'Pulsar Boton\nen maximo')
+    t_down = _travel(board, 'INC-', 'Pulsar Boton\nen minimo')
+    if t_up: calib['t_up'] = t_up
+    if t_down: calib['t_down'] = t_down
+
+def calibrate_speed(board, spd_mngr, calib):
+    _message(board, 'Calibrar\nvelocidad')
+    meter = spd_mngr.meter
+    meter.reset() # not spd_mngr.start(): no logged session for the calibration
+    spd_mngr.cntrl.start()
+    _pulse('SPD+', CAL_PULSE); _pulse('SPD+', CAL_PULSE) # leave the belt minimum speed
+    v0 = meter.speed
+    _pulse('SPD+', CAL_PULSE)
+    v1 = meter.speed
+    _pulse('SPD-', CAL_PULSE)
+    v2 = meter.speed
+    if v1 > v0: calib['gain_up'] = (v1 - v0) / CAL_PULSE
+    if v1 > v2: calib['gain_down'] = (v1 - v2) / CAL_PULSE
+    # step: pulses over BELT_LAPS laps, the button marks a belt mark passing
+    _message(board, 'Pulsar Boton\nal pasar marca')
+    if _wait_button(board) is not None:
+        count = meter.counter
+        _message(board, 'Pulsar tras\n{} vueltas'.format(BELT_LAPS))
+        if _wait_button(board, TIMEOUT * 2) is not None and meter.counter > count:
+            calib['step'] = BELT_LENGTH * BELT_LAPS / (meter.counter - count)
+    while meter.speed > 2.0: _pulse('SPD-', CAL_PULSE)
+    spd_mngr.stop()
+
+def run(spd_mngr, slp_mngr, board):
+    calib = load()
+    calibrate_slope(board, slp_mngr, calib)
+    calibrate_speed(board, spd_mngr, calib)
+    save(calib)
+    _message(board, 'Calibrado')
+    return calib
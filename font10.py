@@ -2,6 +2,8 @@
 # Font: FreeSans.ttf
 version = '0.1'
 
+from array import array
+
 def height():
     return 17
 
@@ -219,11 +221,16 @@ def _chr_addr(ordch):
     offset = 2 * (ordch - 32)
     return int.from_bytes(_index[offset:offset + 2], 'little')
 
+# glyph table built once at import: get_ch/width are O(1) and allocation free
+_offsets = array('H', [_chr_addr(ordch) for ordch in range(32, 128)])
+_widths = bytearray([int.from_bytes(_font[_offsets[i]:_offsets[i] + 2], 'little') for i in range(95)])
+_chars = tuple((_mvfont[_offsets[i] + 2:_offsets[i + 1]], 17, _widths[i]) for i in range(95))
+_default = ord('?') - 32
+
 def get_ch(ch):
     ordch = ord(ch)
-    ordch = ordch if ordch >= 32 and ordch <= 126 else ord('?')
-    offset = _chr_addr(ordch)
-    width = int.from_bytes(_font[offset:offset + 2], 'little')
-    next_offs = _chr_addr(ordch +1)
-    return _mvfont[offset + 2:next_offs], 17, width
- 
+    return _chars[ordch - 32 if ordch >= 32 and ordch <= 126 else _default]
+
+def width(ch):
+    ordch = ord(ch)
+    return _widths[ordch - 32 if ordch >= 32 and ordch <= 126 else _default]
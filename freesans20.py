@@ -2,6 +2,8 @@
 # Font: FreeSans.ttf
 version = '0.25'
 
+from array import array
+
 def height():
     return 20
 
@@ -277,12 +279,17 @@ b'\x88\x0d\x9e\x0d\x9e\x0d\xb4\x0d\xb4\x0d\xca\x0d\xca\x0d\xf4\x0d'\
 
 _mvfont = memoryview(_font)
 
+# glyph table built once at import: get_ch/width are O(1) and allocation free
+# entry 0 is the default glyph, printable chars follow from 1
+_offsets = array('H', [int.from_bytes(_index[4 * i:4 * i + 2], 'little') for i in range(96)])
+_ends = array('H', [int.from_bytes(_index[4 * i + 2:4 * i + 4], 'little') for i in range(96)])
+_widths = bytearray([int.from_bytes(_font[_offsets[i]:_offsets[i] + 2], 'little') for i in range(96)])
+_chars = tuple((_mvfont[_offsets[i] + 2:_ends[i]], 20, _widths[i]) for i in range(96))
+
 def get_ch(ch):
     ordch = ord(ch)
-    ordch = ordch + 1 if ordch >= 32 and ordch <= 126 else 32
-    idx_offs = 4 * (ordch - 32)
-    offset = int.from_bytes(_index[idx_offs : idx_offs + 2], 'little')
-    next_offs = int.from_bytes(_index[idx_offs + 2 : idx_offs + 4], 'little')
-    width = int.from_bytes(_font[offset:offset + 2], 'little')
-    return _mvfont[offset + 2:next_offs], 20, width
- 
+    return _chars[ordch - 31 if ordch >= 32 and ordch <= 126 else 0]
+
+def width(ch):
+    ordch = ord(ch)
+    return _widths[ordch - 31 if ordch >= 32 and ordch <= 126 else 0]
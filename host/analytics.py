@@ -0,0 +1,263 @@
+# analytics.py Session statistics on the host. Records are read in chunks
+# into NumPy arrays (binary store written by logger.py, CSV from
+# host.sessionlog or the old data.csv lines of SpeedManager.log) and every
+# statistic is accumulated chunk by chunk, so months of sessions are
+# analysed in constant memory.
+#
+#   python -m host.analytics sessions.bin|data.csv [...]
+# prints per session figures and the totals: splits per km, time in speed
+# bands, control error (ref vs act), actuator pulses and duty, settling times.
+
+import itertools, os, sys
+import numpy as np
+from . import sessionlog
+
+# mirrors logger.RECORD '<IHHHIBx4h', and the legacy '<IHHHIBx' without on times
+DTYPE = np.dtype([('time', '<u4'), ('ref', '<u2'), ('act', '<u2'), ('slope', '<u2'),
+                  ('distance', '<u4'), ('events', 'u1'), ('pad', 'u1'), ('on', '<i2', (4,))])
+LEGACY_DTYPE = np.dtype(DTYPE.descr[:-1])
+CHUNK = 65536 # records per chunk
+BANDS = (3.0, 6.0, 9.0, 12.0, 15.0) # km/h speed band edges
+TOLERANCE = 0.2 # km/h, |act - ref| considered settled
+_BITS = np.array([bit for _, bit in sessionlog.EVENTS], dtype=np.uint8)
+
+def _columns(time, ref, act, slope, distance, events, on=None):
+    # on: ms each actuator was on per record (n x 4), None when not recorded
+    return {'time': time, 'ref': ref, 'act': act, 'slope': slope,
+            'distance': distance, 'events': events, 'on': on}
+
+def binary_chunks(path, offset=0, length=None, chunk=CHUNK):
+    # chunks of the session segment at offset, length bytes long (None: to
+    # the end of the file), in s, km/h, ratio and m
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        size, _ = sessionlog.read_header(f)
+        dtype = DTYPE if size == DTYPE.itemsize else LEGACY_DTYPE
+        end = os.path.getsize(path) if length is None else offset + length
+        left = (end - f.tell()) // size
+        while left > 0:
+            rec = np.fromfile(f, dtype=dtype, count=min(chunk, left))
+            if not len(rec): return
+            left -= len(rec)
+            yield _columns(rec['time'] / 1000., rec['ref'] / 100., rec['act'] / 100.,
+                           rec['slope'] / 10000., rec['distance'] / 10., rec['events'],
+                           rec['on'] if dtype is DTYPE else None)
+
+def _event_masks(names):
+    uniq, inverse = np.unique(names, return_inverse=True)
+    masks = np.array([sum(bit for name, bit in sessionlog.EVENTS if name in u.split('|'))
+                      for u in uniq], dtype=np.uint8)
+    return masks[inverse.reshape(-1)]
+
+def csv_chunks(path, chunk=CHUNK):
+    # chunks of a CSV session: host.sessionlog output (with header, on times
+    # left empty for legacy records) or the headerless 'duration,ref,act'
+    # lines, whose distance is integrated from act
+    with open(path) as f:
+        first = f.readline()
+        full = first.startswith(sessionlog.FIELDS[0])
+        lines = f if full else itertools.chain((first,), f)
+        on = full and first.rstrip('\r\n').split(',')[6:] == list(sessionlog.ON_TIME)
+        t0 = d0 = a0 = None
+        while True:
+            block = list(itertools.islice(lines, chunk))
+            if not block: return
+            data = np.loadtxt(block, delimiter=',', ndmin=2, usecols=range(5 if full else 3))
+            if full:
+                events = _event_masks(np.loadtxt(block, delimiter=',', ndmin=1, usecols=5, dtype=str))
+                on = on and block[0].rstrip('\r\n').split(',')[6] != ''
+                times = np.loadtxt(block, delimiter=',', ndmin=2, usecols=range(6, 10)) if on else None
+                yield _columns(data[:, 0], data[:, 1], data[:, 2], data[:, 3], data[:, 4], events, times)
+                continue
+            t, act = data[:, 0], data[:, 2]
+            if t0 is None: t0, d0, a0 = t[0], 0., act[0]
+            dt = np.diff(np.concatenate(([t0], t)))
+            step = dt * (np.concatenate(([a0], act[:-1])) + act) / 2 / 3.6 # trapezoids [m]
+            distance = d0 + np.cumsum(step)
+            t0, d0, a0 = t[-1], distance[-1], act[-1]
+            yield _columns(t, data[:, 1], act, np.zeros(len(t)), distance,
+                           np.zeros(len(t), dtype=np.uint8))
+
+def sessions(path, chunk=CHUNK):
+    # (name, chunks) of every session in a file
+    if path.endswith('.csv'):
+        yield os.path.basename(path), csv_chunks(path, chunk)
+        return
+    index = sessionlog.index_path(path)
+    if not os.path.exists(index): # single session file
+        yield os.path.basename(path), binary_chunks(path, chunk=chunk)
+        return
+    for n, (id, _, _, _, offset, _, _) in enumerate(sessionlog.entries(index)):
+        # never closed sessions end at the next segment
+        yield id, binary_chunks(path, offset, sessionlog.length(index, n), chunk)
+
+class SessionStats(object):
+    # statistics of one session, update() with its chunks in order; sessions
+    # are combined with add()
+    def __init__(self, bands=BANDS, tolerance=TOLERANCE):
+        self.edges = np.asarray(bands, dtype=float)
+        self.tolerance = tolerance
+        self.band_time = np.zeros(len(self.edges) + 1) # s below, between and above edges
+        self.pulses = np.zeros(len(_BITS), dtype=np.int64)
+        self.on_ms = np.zeros(len(_BITS)) # recorded actuator on times
+        self.on_duration = 0. # s covered by records with on times
+        self.splits = [] # s per km
+        self.settling = [] # s per reference change, nan when it never settled
+        self.duration = self.distance = 0.
+        self.err_time = self.err_sum = self.err_sq = self.err_abs = self.err_max = 0.
+        self._prev = None # (time, ref, act, distance) of the last record seen
+
+    def update(self, c):
+        t, ref, act, d = c['time'], c['ref'], c['act'], c['distance']
+        if not len(t): return
+        if self._prev is None: self._start(t[0], ref[0], act[0], d[0])
+        pt, pref, pact, pd = self._prev
+        tt = np.concatenate(([pt], t))
+        dt = np.diff(tt)
+        # values held over each interval: those of the previous record
+        href = np.concatenate(([pref], ref[:-1]))
+        hact = np.concatenate(([pact], act[:-1]))
+        self.band_time += np.bincount(np.digitize(hact, self.edges), weights=dt,
+                                      minlength=len(self.band_time))
+        self._error(dt, href, hact)
+        self.pulses += ((c['events'][:, None] & _BITS) != 0).sum(axis=0)
+        if c['on'] is not None:
+            self.on_ms += c['on'].sum(axis=0)
+            self.on_duration += dt.sum()
+        self._splits(tt, np.concatenate(([pd], d)), d[-1])
+        self._settling(t, ref, act, href)
+        self._prev = (t[-1], ref[-1], act[-1], d[-1])
+        self.duration = t[-1] - self._t_start
+        self.distance = d[-1] - self._d_start
+
+    def _start(self, t, ref, act, d):
+        self._prev = (t, ref, act, d)
+        self._t_start, self._d_start = t, d
+        self._km = 1 # next km mark
+        self._km_time = t
+        self._t0, self._ref0, self._settled = t, ref, None
+
+    def _error(self, dt, href, hact):
+        # time weighted, only while a speed is requested
+        err = hact - href
+        w = np.where(href > 0, dt, 0.)
+        self.err_time += w.sum()
+        self.err_sum += (w * err).sum()
+        self.err_sq += (w * err * err).sum()
+        self.err_abs += (w * np.abs(err)).sum()
+        if (href > 0).any(): self.err_max = max(self.err_max, np.abs(err[href > 0]).max())
+
+    def _splits(self, tt, dd, last):
+        marks = self._d_start + np.arange(self._km, int((last - self._d_start) // 1000) + 1) * 1000.
+        if not marks.size: return
+        i = np.searchsorted(dd, marks) # dd[i - 1] < mark <= dd[i]
+        frac = (marks - dd[i - 1]) / (dd[i] - dd[i - 1])
+        crossing = tt[i - 1] + frac * (tt[i] - tt[i - 1])
+        self.splits.extend(np.diff(np.concatenate(([self._km_time], crossing))))
+        self._km_time = crossing[-1]
+        self._km += marks.size
+
+    def _settling(self, t, ref, act, href):
+        # time from a reference change until act enters the tolerance band
+        # for good (up to the next change)
+        inband = np.abs(act - ref) <= self.tolerance
+        bounds = np.concatenate(([0], np.flatnonzero(ref != href), [len(t)]))
+        for k in range(len(bounds) - 1):
+            a, b = bounds[k], bounds[k + 1]
+            if k > 0: # reference changed at a
+                self._close()
+                self._t0, self._ref0, self._settled = t[a], ref[a], None
+            if a == b: continue
+            out = np.flatnonzero(~inband[a:b])
+            if out.size: self._settled = t[a + out[-1] + 1] if a + out[-1] + 1 < b else None
+            elif self._settled is None: self._settled = t[a]
+
+    def _close(self):
+        if self._ref0 <= 0: return # stopped, nothing to settle
+        self.settling.append(np.nan if self._settled is None else self._settled - self._t0)
+
+    def finish(self):
+        # the last reference counts only if it settled before the end
+        if self._prev is not None and self._settled is not None: self._close()
+        self._settled = None
+        return self
+
+    def add(self, other):
+        self.band_time += other.band_time
+        self.pulses += other.pulses
+        self.on_ms += other.on_ms
+        self.on_duration += other.on_duration
+        self.splits.extend(other.splits)
+        self.settling.extend(other.settling)
+        self.duration += other.duration
+        self.distance += other.distance
+        self.err_time += other.err_time
+        self.err_sum += other.err_sum
+        self.err_sq += other.err_sq
+        self.err_abs += other.err_abs
+        self.err_max = max(self.err_max, other.err_max)
+        return self
+
+    @property
+    def error(self): # (mean, rms, mean absolute, max) km/h
+        if not self.err_time: return 0., 0., 0., self.err_max
+        return (self.err_sum / self.err_time, np.sqrt(self.err_sq / self.err_time),
+                self.err_abs / self.err_time, self.err_max)
+
+    @property
+    def duty(self): # fraction of the time each actuator was on, from the recorded on times
+        if not self.on_duration: return {}
+        return {name: ms / 1000. / self.on_duration
+                for (name, _), ms in zip(sessionlog.EVENTS, self.on_ms)}
+
+    @property
+    def speed(self): # km/h
+        return self.distance / self.duration * 3.6 if self.duration else 0.
+
+def analyse(path, chunk=CHUNK, **kwargs):
+    # (name, SessionStats) of every session in a file
+    for name, chunks in sessions(path, chunk):
+        stats = SessionStats(**kwargs)
+        for c in chunks: stats.update(c)
+        yield name, stats.finish()
+
+def _clock(s):
+    return '{:d}:{:02d}'.format(int(s // 60), int(s % 60))
+
+def report(stats, out):
+    mean, rms, mae, top = stats.error
+    out.write('  duration {}  distance {:.2f} km  speed {:.2f} km/h\n'.format(
+        _clock(stats.duration), stats.distance / 1000, stats.speed))
+    if stats.splits:
+        splits = np.asarray(stats.splits)
+        out.write('  splits/km {}  best {}  mean {}\n'.format(
+            len(splits), _clock(splits.min()), _clock(splits.mean())))
+    edges = ['<{:g}'.format(stats.edges[0])] + ['{:g}-{:g}'.format(a, b)
+             for a, b in zip(stats.edges[:-1], stats.edges[1:])] + ['>{:g}'.format(stats.edges[-1])]
+    out.write('  bands ' + '  '.join('{} {}'.format(e, _clock(s))
+                                     for e, s in zip(edges, stats.band_time) if s) + '\n')
+    out.write('  error km/h mean {:+.2f} rms {:.2f} mae {:.2f} max {:.2f}\n'.format(mean, rms, mae, top))
+    duty = stats.duty
+    out.write('  pulses ' + '  '.join('{} {}{}'.format(name, n, ' ({:.1%})'.format(duty[name]) if name in duty else '')
+                                      for (name, _), n in zip(sessionlog.EVENTS, stats.pulses)) + '\n')
+    settling = np.asarray(stats.settling)
+    done = settling[~np.isnan(settling)]
+    if settling.size:
+        out.write('  settling {} changes, {} settled, median {:.1f} s, max {:.1f} s\n'.format(
+            settling.size, done.size, np.median(done) if done.size else np.nan,
+            done.max() if done.size else np.nan))
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit('usage: python -m host.analytics sessions.bin|data.csv [...]')
+    total = SessionStats()
+    for path in argv[1:]:
+        for name, stats in analyse(path):
+            sys.stdout.write('{} {}\n'.format(path, name))
+            report(stats, sys.stdout)
+            total.add(stats)
+    sys.stdout.write('total\n')
+    report(total, sys.stdout)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,335 @@
+# emulator.py Runs the display stack (ssd1306.py, writer.py, board.Display)
+# on a Linux box. install() registers CPython stand-ins for the MicroPython
+# modules they import; FakeI2C/FakeSPI record every bus transaction, keep
+# per frame byte/command counts and feed a Panel that mirrors the SSD1306
+# RAM, so what reaches the panel can be dumped to PGM/PNG.
+#
+#   python -m host.emulator [--check | --update] [output directory]
+# renders the board screens and prints render time and bus volume per frame.
+# --check compares every frame with its golden copy in host/golden (exit
+# status 1 on any difference), --update rewrites the golden copies after an
+# intended rendering change.
+
+import os, sys, time, types, struct, zlib
+from . import framebuf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN = os.path.join(ROOT, 'host', 'golden')
+
+# SSD1306 commands followed by argument bytes
+_CMD_ARGS = { 0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8D: 1, 0xA8: 1,
+              0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1 }
+
+class Panel(object):
+    # SSD1306 GDDRAM with horizontal addressing
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(self.width * self.pages)
+        self.on = False
+        self.contrast = 0
+        self._cmd = None
+        self._args = []
+        self.set_window(0, width - 1, 0, self.pages - 1)
+
+    def set_window(self, c0, c1, p0, p1):
+        self.c0, self.c1, self.p0, self.p1 = c0, c1, p0, p1
+        self.col, self.page = c0, p0
+
+    def command(self, byte):
+        if self._cmd is None:
+            if byte in _CMD_ARGS:
+                self._cmd, self._args = byte, []
+                return
+            if byte & 0xFE == 0xAE: self.on = bool(byte & 1)
+            return
+        self._args.append(byte)
+        if len(self._args) < _CMD_ARGS[self._cmd]: return
+        cmd, args, self._cmd = self._cmd, self._args, None
+        if cmd == 0x21: self.set_window(args[0], args[1], self.p0, self.p1)
+        elif cmd == 0x22: self.set_window(self.c0, self.c1, args[0], args[1])
+        elif cmd == 0x81: self.contrast = args[0]
+
+    def data(self, buf):
+        for byte in buf:
+            if self.col < self.width and self.page < self.pages:
+                self.ram[self.page * self.width + self.col] = byte
+            self.col += 1
+            if self.col > self.c1:
+                self.col = self.c0
+                self.page = self.page + 1 if self.page < self.p1 else self.p0
+
+    def image(self): # rows of 0/1 pixels
+        return [[(self.ram[(y >> 3) * self.width + x] >> (y & 7)) & 1
+                 for x in range(self.width)] for y in range(self.pages * 8)]
+
+    def ascii(self):
+        return '\n'.join(''.join('#' if p else '.' for p in row) for row in self.image())
+
+class BusStats(object):
+    # transaction accounting, frame() closes the current frame
+    def __init__(self):
+        self.frames = []
+        self._reset()
+
+    def _reset(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.commands = 0
+        self.data = 0
+
+    def record(self, nbytes, commands, data):
+        self.transactions += 1
+        self.bytes += nbytes
+        self.commands += commands
+        self.data += data
+
+    def frame(self):
+        stats = { 'transactions': self.transactions, 'bytes': self.bytes,
+                  'commands': self.commands, 'data': self.data }
+        self.frames.append(stats)
+        self._reset()
+        return stats
+
+class FakeI2C(BusStats):
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.freq = kwargs.get('freq', 400000)
+        self.panel = Panel()
+        self.log = [] # (addr, bytes) of every transaction
+
+    def writeto(self, addr, buf, stop=True):
+        self._transaction(addr, bytes(buf))
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        buf = b''.join(bytes(b) for b in vector)
+        self._transaction(addr, buf)
+        return len(buf)
+
+    def _transaction(self, addr, buf):
+        self.log.append((addr, buf))
+        commands = data = 0
+        i = 0
+        while i < len(buf): # control byte: Co (bit 7), D/C# (bit 6)
+            ctrl = buf[i]
+            payload = buf[i + 1:i + 2] if ctrl & 0x80 else buf[i + 1:]
+            i += 1 + len(payload)
+            if ctrl & 0x40:
+                self.panel.data(payload)
+                data += len(payload)
+            else:
+                for byte in payload: self.panel.command(byte)
+                commands += len(payload)
+        self.record(len(buf) + 1, commands, data) # + address byte
+
+class FakePin(object):
+    OUT = 1
+    def __init__(self, value=0):
+        self._value = value
+    def init(self, mode=None, pull=None, value=None):
+        if value is not None: self._value = value
+    def __call__(self, value=None):
+        if value is None: return self._value
+        self._value = value
+    value = __call__
+
+class FakeSPI(BusStats):
+    def __init__(self, dc, cs):
+        super().__init__()
+        self.dc, self.cs = dc, cs
+        self.panel = Panel()
+        self.log = [] # (dc, bytes) of every transaction
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, buf):
+        buf = bytes(buf)
+        self.log.append((self.dc(), buf))
+        if self.dc():
+            self.panel.data(buf)
+            self.record(len(buf), 0, len(buf))
+        else:
+            for byte in buf: self.panel.command(byte)
+            self.record(len(buf), len(buf), 0)
+
+def write_pgm(path, image):
+    height, width = len(image), len(image[0])
+    with open(path, 'wb') as f:
+        f.write('P5\n{} {}\n255\n'.format(width, height).encode())
+        f.write(bytes(255 if p else 0 for row in image for p in row))
+
+def write_pbm(path, image): # 1 bit per pixel, rows padded to bytes
+    height, width = len(image), len(image[0])
+    with open(path, 'wb') as f:
+        f.write('P4\n{} {}\n'.format(width, height).encode())
+        for row in image:
+            row = row + [0] * (-width % 8)
+            f.write(bytes(sum(p << (7 - b) for b, p in enumerate(row[i:i + 8]))
+                          for i in range(0, len(row), 8)))
+
+def read_pbm(path):
+    with open(path, 'rb') as f:
+        magic, width, height = f.readline().split()[0], *map(int, f.readline().split())
+        if magic != b'P4': raise ValueError('not a binary PBM')
+        stride = (width + 7) // 8
+        data = f.read(stride * height)
+    return [[(data[y * stride + (x >> 3)] >> (7 - (x & 7))) & 1 for x in range(width)]
+            for y in range(height)]
+
+def diff(image, golden): # pixels that differ
+    return sum(p != q for row, grow in zip(image, golden) for p, q in zip(row, grow))
+
+def write_png(path, image, scale=1):
+    height, width = len(image) * scale, len(image[0]) * scale
+    raw = b''.join(b'\x00' + bytes(255 if p else 0 for p in row for _ in range(scale))
+                   for row in image for _ in range(scale))
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+               struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw)))
+        f.write(chunk(b'IEND', b''))
+
+# inert pyb/machine/micropython stand-ins, enough to import the board modules
+class _Pin(FakePin):
+    IN, OUT_PP, OUT_OD, PULL_UP, PULL_DOWN = 0, 1, 2, 1, 2
+    cpu = types.SimpleNamespace(**{p + str(n): p + str(n) for p in 'ABC' for n in range(16)})
+    _map = {}
+    def __init__(self, name, *args, **kwargs):
+        super().__init__()
+        self.name = name
+    @classmethod
+    def dict(cls, d=None):
+        if d is not None: cls._map = d
+        return cls._map
+    def on(self): self._value = 1
+    def off(self): self._value = 0
+    high, low = on, off
+
+class _ExtInt(object):
+    IRQ_FALLING, IRQ_RISING = 0, 1
+    def __init__(self, pin, mode, pull, callback):
+        self.callback = callback
+    def enable(self): pass
+    def disable(self): pass
+
+class _ADC(object):
+    def __init__(self, pin):
+        self.level = 0
+    def read(self):
+        return self.level
+    def read_timed(self, buf, timer):
+        for i in range(len(buf)): buf[i] = self.level
+
+class _Timer(object):
+    def __init__(self, n, freq=None, **kwargs):
+        self.n, self.freq = n, freq
+        self.cb = None
+    def init(self, freq=None, **kwargs): self.freq = freq
+    def callback(self, cb): self.cb = cb
+    def deinit(self): self.cb = None
+
+class _USB_VCP(object):
+    # keeps what is sent, connected when a host would have the port open
+    def __init__(self, *args):
+        self.connected = True
+        self.out = bytearray()
+    def isconnected(self): return self.connected
+    def send(self, buf, timeout=5000):
+        self.out += bytes(buf)
+        return len(buf)
+    write = send
+
+class _LED(object):
+    def __init__(self, n): pass
+    def on(self): pass
+    def off(self): pass
+
+def _ticks_ms(): return int(time.monotonic() * 1000) & 0x3FFFFFFF
+def _ticks_us(): return int(time.monotonic() * 1000000) & 0x3FFFFFFF
+def _ticks_diff(a, b): return ((a - b + 0x20000000) & 0x3FFFFFFF) - 0x20000000
+def _ticks_add(a, b): return (a + b) & 0x3FFFFFFF
+
+def install():
+    # register the stand-ins and make the project modules importable
+    micropython = types.ModuleType('micropython')
+    micropython.const = lambda x: x
+    micropython.alloc_emergency_exception_buf = lambda n: None
+    micropython.schedule = lambda fn, arg: fn(arg)
+    micropython.mem_info = lambda *args: None
+    pyb = types.ModuleType('pyb')
+    pyb.Pin, pyb.ExtInt, pyb.ADC, pyb.Timer, pyb.LED = _Pin, _ExtInt, _ADC, _Timer, _LED
+    pyb.USB_VCP = _USB_VCP
+    pyb.delay = lambda ms: None
+    pyb.udelay = lambda us: None
+    pyb.disable_irq = lambda: 0
+    pyb.enable_irq = lambda state=0: None
+    pyb.wfi = lambda: None
+    pyb.rng = lambda: 0
+    pyb.hard_reset = lambda: sys.exit(0)
+    machine = types.ModuleType('machine')
+    machine.I2C = machine.SoftI2C = FakeI2C
+    machine.Pin = _Pin
+    for name, fn in (('ticks_ms', _ticks_ms), ('ticks_us', _ticks_us),
+                     ('ticks_diff', _ticks_diff), ('ticks_add', _ticks_add),
+                     ('sleep_ms', lambda ms: None), ('sleep_us', lambda us: None)):
+        if not hasattr(time, name): setattr(time, name, fn)
+    sys.modules.update({ 'framebuf': framebuf, 'micropython': micropython,
+                         'pyb': pyb, 'machine': machine })
+    if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+def _frame(name, bus, render, outdir, golden):
+    # returns False when golden == 'check' and the frame differs from its copy
+    start = time.perf_counter()
+    render()
+    elapsed = (time.perf_counter() - start) * 1000
+    stats = bus.frame()
+    image = bus.panel.image()
+    path = os.path.join(GOLDEN, name + '.pbm')
+    status = ''
+    if golden == 'update': write_pbm(path, image)
+    elif golden == 'check':
+        pixels = diff(image, read_pbm(path)) if os.path.exists(path) else None
+        status = '  no golden' if pixels is None else '  {} pixels differ'.format(pixels) if pixels else '  ok'
+    print('{:<24} render {:7.1f} ms  {transactions:3d} transactions {bytes:5d} bytes '
+          '{commands:3d} cmds {data:5d} data{}'.format(name, elapsed, status, **stats))
+    if outdir:
+        write_png(os.path.join(outdir, name + '.png'), image, scale=4)
+        write_pgm(os.path.join(outdir, name + '.pgm'), image)
+    return status in ('', '  ok')
+
+def main(outdir=None, golden=None):
+    # golden: None, 'check' or 'update'; returns the number of frames failing the check
+    install()
+    from board import Display
+    from speed import Speed
+    if outdir: os.makedirs(outdir, exist_ok=True)
+    if golden == 'update': os.makedirs(GOLDEN, exist_ok=True)
+    display = Display()
+    bus = display.i2c
+    frames = [('init', lambda: None)]
+    for n, msg in enumerate(('Bajar\nControles!!', 'Preparado?\nPulsar Boton!!', 'Parando!!')):
+        frames.append(('msg{}'.format(n), lambda msg=msg: (display.set_msg(msg), display.show_msg())))
+    for n, data in enumerate(((Speed(8.0, 6.1), 12.0, 5), (Speed(8.0, 7.9), 850.0, 65),
+                              (Speed(8.0, 8.0), 850.2, 66), (Speed(12.5, 12.4), 10100.0, 3725))):
+        frames.append(('data{}'.format(n), lambda data=data: (display.set_data(data), display.show_data())))
+    def text(): # built-in 8x8 font through SSD1306.text
+        display.screen.fill(0)
+        display.screen.text('Calibrar 8x8', 0, 0)
+        display.screen.text('0123456789 km/h', 0, 28)
+        display.screen.show()
+    frames.append(('text', text))
+    return sum(not _frame(name, bus, render, outdir, golden) for name, render in frames)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    golden = 'check' if '--check' in args else 'update' if '--update' in args else None
+    dirs = [a for a in args if not a.startswith('--')]
+    failed = main(dirs[0] if dirs else None, golden)
+    if failed:
+        print('{} frames differ from host/golden'.format(failed))
+        sys.exit(1)
@@ -0,0 +1,214 @@
+# framebuf.py CPython stand-in for MicroPython's framebuf module.
+# Pixel exact for the monochrome formats used by this project
+# (MONO_VLSB for the SSD1306, MONO_HLSB/MONO_HMSB for font glyphs).
+# text() uses an 8x8 font laid out like MicroPython's built-in one (8 column
+# bytes per char, LSB on top, chars 32-127); glyph shapes are close to the
+# board's but not guaranteed pixel identical.
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+MVLSB = MONO_VLSB
+
+_FONT = bytes((
+    0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x00, # 32
+    0x00,0x00,0x00,0x00,0x5f,0x00,0x00,0x00, # !
+    0x00,0x00,0x00,0x03,0x00,0x03,0x00,0x00, # "
+    0x00,0x24,0x7e,0x24,0x24,0x7e,0x24,0x00, # #
+    0x00,0x2e,0x2a,0x7f,0x2a,0x3a,0x00,0x00, # $
+    0x00,0x46,0x26,0x10,0x08,0x64,0x62,0x00, # %
+    0x00,0x20,0x54,0x4a,0x54,0x20,0x50,0x00, # &
+    0x00,0x00,0x00,0x04,0x02,0x00,0x00,0x00, # '
+    0x00,0x00,0x00,0x3c,0x42,0x00,0x00,0x00, # (
+    0x00,0x00,0x00,0x42,0x3c,0x00,0x00,0x00, # )
+    0x00,0x10,0x54,0x38,0x54,0x10,0x00,0x00, # *
+    0x00,0x10,0x10,0x7c,0x10,0x10,0x00,0x00, # +
+    0x00,0x00,0x00,0x80,0x60,0x00,0x00,0x00, # ,
+    0x00,0x10,0x10,0x10,0x10,0x10,0x00,0x00, # -
+    0x00,0x00,0x00,0x60,0x60,0x00,0x00,0x00, # .
+    0x00,0x40,0x20,0x10,0x08,0x04,0x00,0x00, # /
+    0x3c,0x62,0x52,0x4a,0x46,0x3c,0x00,0x00, # 0
+    0x00,0x00,0x44,0x42,0x7e,0x40,0x40,0x00, # 1
+    0x00,0x64,0x52,0x52,0x52,0x52,0x4c,0x00, # 2
+    0x00,0x24,0x42,0x42,0x4a,0x4a,0x34,0x00, # 3
+    0x00,0x30,0x28,0x24,0x7e,0x20,0x20,0x00, # 4
+    0x00,0x2e,0x4a,0x4a,0x4a,0x4a,0x32,0x00, # 5
+    0x00,0x3c,0x4a,0x4a,0x4a,0x4a,0x30,0x00, # 6
+    0x00,0x02,0x02,0x62,0x12,0x0a,0x06,0x00, # 7
+    0x00,0x34,0x4a,0x4a,0x4a,0x4a,0x34,0x00, # 8
+    0x00,0x0c,0x52,0x52,0x52,0x52,0x3c,0x00, # 9
+    0x00,0x00,0x00,0x48,0x00,0x00,0x00,0x00, # :
+    0x00,0x00,0x80,0x64,0x00,0x00,0x00,0x00, # ;
+    0x00,0x00,0x10,0x28,0x44,0x00,0x00,0x00, # <
+    0x00,0x28,0x28,0x28,0x28,0x28,0x00,0x00, # =
+    0x00,0x00,0x44,0x28,0x10,0x00,0x00,0x00, # >
+    0x00,0x04,0x02,0x02,0x52,0x0a,0x04,0x00, # ?
+    0x00,0x3c,0x42,0x5a,0x56,0x5a,0x1c,0x00, # @
+    0x7c,0x12,0x12,0x12,0x12,0x7c,0x00,0x00, # A
+    0x7e,0x4a,0x4a,0x4a,0x4a,0x34,0x00,0x00, # B
+    0x00,0x3c,0x42,0x42,0x42,0x42,0x24,0x00, # C
+    0x00,0x7e,0x42,0x42,0x42,0x24,0x18,0x00, # D
+    0x00,0x7e,0x4a,0x4a,0x4a,0x4a,0x42,0x00, # E
+    0x00,0x7e,0x0a,0x0a,0x0a,0x0a,0x02,0x00, # F
+    0x00,0x3c,0x42,0x42,0x52,0x52,0x34,0x00, # G
+    0x00,0x7e,0x08,0x08,0x08,0x08,0x7e,0x00, # H
+    0x00,0x00,0x42,0x42,0x7e,0x42,0x42,0x00, # I
+    0x00,0x30,0x40,0x40,0x40,0x40,0x3e,0x00, # J
+    0x00,0x7e,0x08,0x08,0x14,0x22,0x40,0x00, # K
+    0x00,0x7e,0x40,0x40,0x40,0x40,0x40,0x00, # L
+    0x00,0x7e,0x04,0x08,0x08,0x04,0x7e,0x00, # M
+    0x00,0x7e,0x04,0x08,0x10,0x20,0x7e,0x00, # N
+    0x00,0x3c,0x42,0x42,0x42,0x42,0x3c,0x00, # O
+    0x00,0x7e,0x12,0x12,0x12,0x12,0x0c,0x00, # P
+    0x00,0x3c,0x42,0x52,0x62,0x42,0x3c,0x00, # Q
+    0x00,0x7e,0x12,0x12,0x12,0x32,0x4c,0x00, # R
+    0x00,0x24,0x4a,0x4a,0x4a,0x4a,0x30,0x00, # S
+    0x02,0x02,0x02,0x7e,0x02,0x02,0x02,0x00, # T
+    0x00,0x3e,0x40,0x40,0x40,0x40,0x3e,0x00, # U
+    0x00,0x1e,0x20,0x40,0x40,0x20,0x1e,0x00, # V
+    0x00,0x3e,0x40,0x20,0x20,0x40,0x3e,0x00, # W
+    0x00,0x42,0x24,0x18,0x18,0x24,0x42,0x00, # X
+    0x02,0x04,0x08,0x70,0x08,0x04,0x02,0x00, # Y
+    0x00,0x42,0x62,0x52,0x4a,0x46,0x42,0x00, # Z
+    0x00,0x00,0x7e,0x42,0x42,0x00,0x00,0x00, # [
+    0x00,0x04,0x08,0x10,0x20,0x40,0x00,0x00, # backslash
+    0x00,0x00,0x42,0x42,0x7e,0x00,0x00,0x00, # ]
+    0x00,0x08,0x04,0x7e,0x04,0x08,0x00,0x00, # ^
+    0x80,0x80,0x80,0x80,0x80,0x80,0x80,0x00, # _
+    0x00,0x00,0x00,0x02,0x04,0x00,0x00,0x00, # `
+    0x00,0x20,0x54,0x54,0x54,0x54,0x78,0x00, # a
+    0x00,0x7e,0x48,0x48,0x48,0x48,0x30,0x00, # b
+    0x00,0x38,0x44,0x44,0x44,0x44,0x28,0x00, # c
+    0x00,0x30,0x48,0x48,0x48,0x48,0x7e,0x00, # d
+    0x00,0x38,0x54,0x54,0x54,0x54,0x58,0x00, # e
+    0x00,0x00,0x08,0x7c,0x0a,0x0a,0x00,0x00, # f
+    0x00,0x18,0xa4,0xa4,0xa4,0xa4,0x7c,0x00, # g
+    0x00,0x7e,0x08,0x08,0x08,0x08,0x70,0x00, # h
+    0x00,0x00,0x00,0x48,0x7a,0x40,0x00,0x00, # i
+    0x00,0x00,0x40,0x80,0x80,0x7a,0x00,0x00, # j
+    0x00,0x7e,0x18,0x24,0x40,0x00,0x00,0x00, # k
+    0x00,0x00,0x00,0x3e,0x40,0x40,0x00,0x00, # l
+    0x00,0x7c,0x04,0x78,0x04,0x04,0x78,0x00, # m
+    0x00,0x7c,0x04,0x04,0x04,0x04,0x78,0x00, # n
+    0x00,0x38,0x44,0x44,0x44,0x44,0x38,0x00, # o
+    0x00,0xfc,0x24,0x24,0x24,0x24,0x18,0x00, # p
+    0x00,0x18,0x24,0x24,0x24,0x24,0xfc,0x80, # q
+    0x00,0x00,0x7c,0x08,0x04,0x04,0x00,0x00, # r
+    0x00,0x48,0x54,0x54,0x54,0x54,0x24,0x00, # s
+    0x00,0x04,0x04,0x3e,0x44,0x44,0x00,0x00, # t
+    0x00,0x3c,0x40,0x40,0x40,0x40,0x7c,0x00, # u
+    0x00,0x1c,0x20,0x40,0x40,0x20,0x1c,0x00, # v
+    0x00,0x3c,0x40,0x30,0x40,0x40,0x3c,0x00, # w
+    0x00,0x44,0x28,0x10,0x10,0x28,0x44,0x00, # x
+    0x00,0x1c,0xa0,0xa0,0xa0,0xa0,0x7c,0x00, # y
+    0x00,0x44,0x64,0x54,0x4c,0x44,0x00,0x00, # z
+    0x00,0x08,0x08,0x76,0x42,0x42,0x00,0x00, # {
+    0x00,0x00,0x00,0x7e,0x00,0x00,0x00,0x00, # |
+    0x00,0x42,0x42,0x76,0x08,0x08,0x00,0x00, # }
+    0x00,0x00,0x04,0x02,0x04,0x02,0x00,0x00, # ~
+    0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x00, # 127
+))
+
+class FrameBuffer(object):
+    def __init__(self, buf, width, height, format, stride=None):
+        if format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB):
+            raise ValueError('invalid format')
+        self._buf = buf
+        self._w = width
+        self._h = height
+        self._format = format
+        self._stride = width if stride is None else stride
+        if format != MONO_VLSB: # rows are byte aligned
+            self._stride = (self._stride + 7) & ~7
+
+    def _index(self, x, y):
+        if self._format == MONO_VLSB:
+            return (y >> 3) * self._stride + x, y & 7
+        offset = x + y * self._stride
+        if self._format == MONO_HLSB:
+            return offset >> 3, 7 - (offset & 7)
+        return offset >> 3, offset & 7
+
+    def _get(self, x, y):
+        i, bit = self._index(x, y)
+        return (self._buf[i] >> bit) & 1
+
+    def _set(self, x, y, c):
+        i, bit = self._index(x, y)
+        if c: self._buf[i] |= 1 << bit
+        else: self._buf[i] &= ~(1 << bit) & 0xFF
+
+    def _fill_rect(self, x, y, w, h, c):
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self._w), min(y + h, self._h)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def fill(self, c):
+        self._fill_rect(0, 0, self._w, self._h, c)
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._w and 0 <= y < self._h):
+            return
+        if c is None: return self._get(x, y)
+        self._set(x, y, c)
+
+    def hline(self, x, y, w, c):
+        self._fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self._fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self._fill_rect(x, y, w, h, c)
+            return
+        self._fill_rect(x, y, w, 1, c)
+        self._fill_rect(x, y + h - 1, w, 1, c)
+        self._fill_rect(x, y, 1, h, c)
+        self._fill_rect(x + w - 1, y, 1, h, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        self._fill_rect(x, y, w, h, c)
+
+    def line(self, x0, y0, x1, y1, c): # Bresenham
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        err = dx + dy
+        while True:
+            self.pixel(x0, y0, c)
+            if x0 == x1 and y0 == y1: break
+            e2 = 2 * err
+            if e2 >= dy: err += dy; x0 += sx
+            if e2 <= dx: err += dx; y0 += sy
+
+    def scroll(self, xstep, ystep):
+        # like MicroPython, the uncovered area keeps its old content
+        src = [[self._get(x, y) for x in range(self._w)] for y in range(self._h)]
+        for y in range(self._h):
+            for x in range(self._w):
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < self._w and 0 <= sy < self._h:
+                    self._set(x, y, src[sy][sx])
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for sy in range(fbuf._h):
+            if not 0 <= y + sy < self._h: continue
+            for sx in range(fbuf._w):
+                if not 0 <= x + sx < self._w: continue
+                c = fbuf._get(sx, sy)
+                if c == key: continue
+                if palette is not None: c = palette._get(c, 0)
+                self._set(x + sx, y + sy, c)
+
+    def text(self, s, x, y, c=1):
+        # like MicroPython, only the glyph pixels are drawn; other chars use 127
+        for ch in s:
+            code = ord(ch)
+            if not 32 <= code <= 127: code = 127
+            glyph = _FONT[(code - 32) * 8:(code - 31) * 8]
+            for col, bits in enumerate(glyph):
+                for row in range(8):
+                    if bits >> row & 1: self.pixel(x + col, y + row, c)
+            x += 8
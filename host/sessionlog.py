@@ -0,0 +1,113 @@
+# sessionlog.py Decodes the binary session store written by logger.py
+# (SessionStore, SessionLogger) on the board.
+#
+#   python -m host.sessionlog sessions.bin
+# lists the sessions in the index kept next to the data file (sessions.idx),
+#   python -m host.sessionlog sessions.bin N [out.csv]
+# writes the records of session N as CSV (stdout when no output file is given).
+
+import csv, os, struct, sys
+
+# mirrors logger.py
+MAGIC = b'TML1'
+HEADER = '<HH'
+RECORD = '<IHHHIBx4h'
+LEGACY = '<IHHHIBx' # records written before the actuator on times
+EVENTS = (('spd+', 1), ('spd-', 2), ('inc+', 4), ('inc-', 8))
+ON_TIME = tuple(name + '_ms' for name, _ in EVENTS)
+FIELDS = ('time', 'ref', 'act', 'slope', 'distance', 'events') + ON_TIME
+ENTRY = '<IIIIIIH6x'
+ENTRY_SIZE = struct.calcsize(ENTRY)
+
+def index_path(path):
+    return os.path.splitext(path)[0] + '.idx'
+
+def entry(index, n):
+    # (id, start [ms], duration [s], distance [m], offset, size, speed [km/h])
+    with open(index, 'rb') as f:
+        f.seek(n * ENTRY_SIZE)
+        data = f.read(ENTRY_SIZE)
+    if len(data) < ENTRY_SIZE: raise IndexError('no session {}'.format(n))
+    id, start, duration, distance, offset, size, speed = struct.unpack(ENTRY, data)
+    return id, start, duration / 1000, distance / 10, offset, size, speed / 100
+
+def entries(index):
+    for n in range(os.path.getsize(index) // ENTRY_SIZE): yield entry(index, n)
+
+def length(index, n):
+    # bytes of session n segment; a session never closed (size 0) runs up to
+    # the next segment, or to the end of the file (None) when it is the last
+    size = entry(index, n)[5]
+    if size: return size
+    if n + 1 < os.path.getsize(index) // ENTRY_SIZE:
+        return entry(index, n + 1)[4] - entry(index, n)[4]
+    return None
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC: raise ValueError('not a session log')
+    size, period = struct.unpack(HEADER, f.read(struct.calcsize(HEADER)))
+    if size not in (struct.calcsize(RECORD), struct.calcsize(LEGACY)):
+        raise ValueError('unknown record size {}'.format(size))
+    return size, period
+
+def decode(data, size=struct.calcsize(RECORD)):
+    # yields (time [s], ref [km/h], act [km/h], slope [ratio], distance [m], events,
+    # on times [ms]), on times None in legacy records
+    if size == struct.calcsize(LEGACY):
+        for t, ref, act, slope, distance, events in struct.iter_unpack(LEGACY, data):
+            yield t / 1000, ref / 100, act / 100, slope / 10000, distance / 10, events, None
+        return
+    for t, ref, act, slope, distance, events, *on in struct.iter_unpack(RECORD, data):
+        yield t / 1000, ref / 100, act / 100, slope / 10000, distance / 10, events, tuple(on)
+
+def records(path, offset=0, length=None, chunk=4096):
+    # streams the records of the session segment at offset, length bytes long
+    # (None: up to the end of the file)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        size, _ = read_header(f)
+        left = None if length is None else length - len(MAGIC) - struct.calcsize(HEADER)
+        chunk -= chunk % size
+        while left is None or left >= size:
+            data = f.read(chunk if left is None else min(chunk, left))
+            if len(data) < size: return
+            if left is not None: left -= len(data)
+            yield from decode(data[:len(data) - len(data) % size], size)
+
+def session(path, n):
+    # records of session n, located through the index
+    index = index_path(path)
+    return records(path, entry(index, n)[4], length(index, n))
+
+def event_names(events):
+    return '|'.join(name for name, bit in EVENTS if events & bit)
+
+def to_csv(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(FIELDS)
+    for t, ref, act, slope, distance, events, on in rows:
+        writer.writerow(('{:.3f}'.format(t), '{:.2f}'.format(ref), '{:.2f}'.format(act),
+                         '{:.4f}'.format(slope), '{:.1f}'.format(distance), event_names(events))
+                        + (('',) * len(ON_TIME) if on is None else on))
+
+def list_sessions(path, out):
+    # size 0: session not closed (power lost), its records are still readable
+    out.write('{:>4} {:>10} {:>9} {:>9} {:>7} {:>9} {:>7}\n'.format(
+        'id', 'start[ms]', 'time[s]', 'dist[m]', 'km/h', 'offset', 'bytes'))
+    for id, start, duration, distance, offset, size, speed in entries(index_path(path)):
+        out.write('{:4d} {:10d} {:9.1f} {:9.1f} {:7.2f} {:9d} {:7d}\n'.format(
+            id, start, duration, distance, speed, offset, size))
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit('usage: python -m host.sessionlog sessions.bin [session [out.csv]]')
+    if len(argv) == 2:
+        list_sessions(argv[1], sys.stdout)
+        return
+    rows = session(argv[1], int(argv[2]))
+    if len(argv) > 3:
+        with open(argv[3], 'w', newline='') as out: to_csv(rows, out)
+    else: to_csv(rows, sys.stdout)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,98 @@
+# telemetry.py Receives the live telemetry frames sent by telemetry.py on
+# the board over its USB serial port.
+#
+#   python -m host.telemetry /dev/ttyACM0 [out.csv]
+# prints one line per frame (and writes them as CSV when a file is given).
+# Decoder works on any byte source: REPL text and broken frames in the
+# stream are skipped by resyncing on the sync bytes and the CRC.
+
+import csv, struct, sys, zlib
+from collections import namedtuple
+
+# mirrors telemetry.py
+SYNC = b'\xaa\x55'
+PAYLOAD = '<IHHIIHHhBbbx'
+PAYLOAD_SIZE = struct.calcsize(PAYLOAD)
+FRAME_SIZE = len(SYNC) + 2 + PAYLOAD_SIZE + 4
+STATES = (('spd', 1), ('inc', 2), ('pi', 4), ('sat', 8))
+
+Frame = namedtuple('Frame', ('seq', 'time', 'act', 'ref', 'distance', 'duration', 'rslope',
+                             'slope', 'integral', 'state', 'spd', 'inc'))
+
+def decode(seq, payload):
+    # Frame in s, km/h, m, ratio, km/h*s
+    time, act, ref, distance, duration, rslope, slope, integral, state, spd, inc = \
+        struct.unpack(PAYLOAD, payload)
+    return Frame(seq, time / 1000, act / 100, ref / 100, distance / 10, duration / 1000,
+                 rslope / 10000, slope / 10000, integral / 100, state, spd, inc)
+
+def state_names(state):
+    return '|'.join(name for name, bit in STATES if state & bit)
+
+class Decoder(object):
+    # feed() bytes as they arrive, get the complete frames found so far
+    def __init__(self):
+        self._buf = bytearray()
+        self.frames = 0
+        self.errors = 0 # frames discarded on a CRC or length mismatch
+        self.lost = 0 # frames missing according to the sequence numbers
+        self._seq = None
+
+    def feed(self, data):
+        self._buf += data
+        frames = []
+        while True:
+            start = self._buf.find(SYNC)
+            if start < 0:
+                del self._buf[:max(len(self._buf) - 1, 0)] # keep a possible half sync
+                return frames
+            del self._buf[:start]
+            if len(self._buf) < FRAME_SIZE: return frames
+            frame = bytes(self._buf[:FRAME_SIZE])
+            crc, = struct.unpack_from('<I', frame, FRAME_SIZE - 4)
+            if frame[2] != PAYLOAD_SIZE or zlib.crc32(frame[2:FRAME_SIZE - 4]) != crc:
+                self.errors += 1
+                del self._buf[:1] # not a frame: look for the next sync
+                continue
+            del self._buf[:FRAME_SIZE]
+            seq = frame[3]
+            if self._seq is not None: self.lost += (seq - self._seq - 1) & 0xff
+            self._seq = seq
+            self.frames += 1
+            frames.append(decode(seq, frame[4:FRAME_SIZE - 4]))
+
+class Receiver(object):
+    # frames from the board serial port
+    def __init__(self, port, timeout=0.5):
+        import serial # pyserial
+        self.serial = serial.Serial(port, timeout=timeout)
+        self.decoder = Decoder()
+
+    def __iter__(self):
+        while True:
+            data = self.serial.read(max(self.serial.in_waiting, 1))
+            for frame in self.decoder.feed(data): yield frame
+
+    def close(self):
+        self.serial.close()
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit('usage: python -m host.telemetry /dev/ttyACM0 [out.csv]')
+    receiver = Receiver(argv[1])
+    out = open(argv[2], 'w', newline='') if len(argv) > 2 else None
+    writer = csv.writer(out) if out else None
+    if writer: writer.writerow(Frame._fields)
+    try:
+        for f in receiver:
+            print('{:9.3f}s {:5.2f}/{:5.2f} km/h {:8.1f} m slope {:.3f}/{:.3f} {} lost {}'.format(
+                f.time, f.act, f.ref, f.distance, f.slope, f.rslope, state_names(f.state),
+                receiver.decoder.lost))
+            if writer: writer.writerow(f)
+    except KeyboardInterrupt: pass
+    finally:
+        receiver.close()
+        if out: out.close()
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,254 @@
+from time import ticks_ms, ticks_diff
+from micropython import const
+from array import array
+import micropython
+import struct
+import os
+
+# Session logger: fixed size binary records packed into a preallocated RAM
+# ring and written to flash a whole block at a time by a task of its own
+# (signal), or from a scheduled callback without one, rather than from the
+# control loop. host/sessionlog.py decodes it.
+#
+# Sessions are appended to a data file, each one as a segment:
+#         header  b'TML1' + '<HH' record size, record period [ms]
+#         records '<IHHHIBx4h'
+#           time      ms since session start
+#           ref, act  reference and actual speed [km/h * 100]
+#           slope     slope reference [ratio * 10000]
+#           distance  [m * 10]
+#           events    actuator pulses started since the previous record
+#           on time   ms SPD+, SPD-, INC+, INC- are on for those pulses,
+#                     negative when a pulse logged before was cut short
+# (16 byte records, without on time, were written before it was added)
+
+MAGIC = b'TML1'
+RECORD = '<IHHHIBx4h'
+RECORD_SIZE = const(24)
+EV_SPD_UP = const(1)
+EV_SPD_DOWN = const(2)
+EV_INC_UP = const(4)
+EV_INC_DOWN = const(8)
+_ACTUATOR = {EV_SPD_UP: 0, EV_SPD_DOWN: 1, EV_INC_UP: 2, EV_INC_DOWN: 3} # on time slot
+# index entry: id, start tick [ms], duration [ms], distance [m * 10],
+#              segment offset and size [bytes], average speed [km/h * 100]
+ENTRY = '<IIIIIIH6x'
+ENTRY_SIZE = const(32)
+
+class SessionStore(object):
+    # append only session data file plus a fixed size entry index, so any
+    # session is listed or fetched with a single seek. The oldest sessions
+    # are dropped when a new one starts with the data file over max_bytes or
+    # the filesystem short of reserve free bytes.
+    MAX_BYTES = 262144 # data file size that triggers dropping old sessions
+    RESERVE = const(16384) # free filesystem bytes wanted for a new session
+    def __init__(self, data='sessions.bin', index='sessions.idx',
+                 max_bytes=MAX_BYTES, reserve=RESERVE):
+        self.data = data
+        self.index = index
+        self.max_bytes = max_bytes
+        self.reserve = reserve
+        self._entry = bytearray(ENTRY_SIZE)
+        self._copy = bytearray(512)
+
+    def _size(self, path):
+        try: return os.stat(path)[6]
+        except OSError: return 0
+
+    def count(self):
+        return self._size(self.index) // ENTRY_SIZE
+
+    def _free(self): # bytes left on the filesystem
+        st = os.statvfs(self.data.rsplit('/', 1)[0] if '/' in self.data else '.')
+        return st[1] * st[4] # f_frsize * f_bavail
+
+    def _copy_from(self, src, dst, offset):
+        # dst gets the bytes of src from offset on
+        buf = self._copy
+        with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+            fin.seek(offset)
+            while True:
+                n = fin.readinto(buf)
+                if not n: return
+                fout.write(buf if n == len(buf) else memoryview(buf)[:n])
+
+    def drop(self, k):
+        # removes the k oldest sessions, later segments move to the start
+        n = self.count()
+        if k <= 0: return
+        if k >= n:
+            for path in (self.index, self.data):
+                try: os.remove(path)
+                except OSError: pass
+            return
+        shift = self.entry(k)[4]
+        self._copy_from(self.data, self.data + '.tmp', shift)
+        with open(self.index + '.tmp', 'wb') as f:
+            for i in range(k, n):
+                id, start, duration, distance, offset, size, speed = self.entry(i)
+                struct.pack_into(ENTRY, self._entry, 0, id, start, duration, distance,
+                                 offset - shift, size, speed)
+                f.write(self._entry)
+        os.remove(self.data)
+        os.rename(self.data + '.tmp', self.data)
+        os.remove(self.index)
+        os.rename(self.index + '.tmp', self.index)
+
+    def _make_room(self):
+        # drops the oldest sessions down to half max_bytes, so it seldom runs
+        size, free = self._size(self.data), self._free()
+        if size < self.max_bytes and free >= self.reserve: return
+        n, k = self.count(), 0
+        target = self.max_bytes // 2 if free >= self.reserve else size - (self.reserve - free)
+        while k < n and size - self.entry(k)[4] > target: k += 1
+        try: self.drop(k)
+        except OSError: self.drop(n) # no room left even to move them: drop all
+
+    def entry(self, n):
+        # (id, start, duration, distance, offset, size, speed)
+        with open(self.index, 'rb') as f:
+            f.seek(n * ENTRY_SIZE)
+            return struct.unpack(ENTRY, f.read(ENTRY_SIZE))
+
+    def entries(self):
+        for n in range(self.count()): yield self.entry(n)
+
+    def read(self, n, start=0, size=None):
+        # bytes of session n segment, from start for size bytes
+        _, _, _, _, offset, length, _ = self.entry(n)
+        if not length: # never closed: up to the next segment or the end of the file
+            end = self.entry(n + 1)[4] if n + 1 < self.count() else self._size(self.data)
+            length = end - offset
+        size = length - start if size is None else min(size, length - start)
+        with open(self.data, 'rb') as f:
+            f.seek(offset + start)
+            return f.read(size)
+
+    def begin(self, start_tick):
+        # appends a provisional index entry and opens the data file for the
+        # new segment, returns (session id, file); OSError when flash is full
+        self._make_room()
+        if self._free() < self.reserve: raise OSError(28) # ENOSPC
+        self._slot = self.count()
+        self.session = self.entry(self._slot - 1)[0] + 1 if self._slot else 0
+        self._offset = self._size(self.data)
+        self._start = start_tick
+        self._write_entry(0, 0, 0, 0)
+        return self.session, open(self.data, 'ab')
+
+    def end(self, file, duration, distance, speed):
+        file.close()
+        size = self._size(self.data) - self._offset
+        self._write_entry(int(duration * 1000), max(int(distance * 10), 0), size,
+                          min(max(int(speed * 100), 0), 0xffff))
+
+    def _write_entry(self, duration, distance, size, speed):
+        struct.pack_into(ENTRY, self._entry, 0, self.session, self._start, duration,
+                         distance, self._offset, size, speed)
+        with open(self.index, 'r+b' if self._size(self.index) else 'wb') as f:
+            f.seek(self._slot * ENTRY_SIZE)
+            f.write(self._entry)
+
+class SessionLogger(object):
+    BLOCK_RECORDS = const(32) # records per flash write (768 bytes)
+    N_BLOCKS = const(4)
+    PERIOD = const(1000) # ms between records, unless an event forces one
+
+    def __init__(self, store=None, period=PERIOD):
+        self.store = SessionStore() if store is None else store
+        self.period = period
+        self._capacity = self.BLOCK_RECORDS * self.N_BLOCKS # records
+        self._ring = bytearray(RECORD_SIZE * self._capacity)
+        self._mvring = memoryview(self._ring)
+        self._flush_ref = self._flush_cb # bound once for schedule()
+        self.signal = None # asyncio.Event set when a block is due, its task flushes
+        self.file = None
+        self.slope = 0 # latest slope reference, set by SlopeManager
+        self.events = 0
+        self.on_time = array('l', (0, 0, 0, 0)) # ms per actuator since the previous record
+        self.dropped = 0 # records lost with the ring full
+        self.error = None # OSError that stopped logging, it never reaches the control path
+
+    def _fail(self, e):
+        # flash full or damaged: the session goes on without a log
+        self.error = e
+        if self.file is not None:
+            try: self.file.close()
+            except OSError: pass
+        self.file = None
+
+    def start(self):
+        self.start_time = ticks_ms()
+        self.error = None
+        try:
+            self.session, self.file = self.store.begin(self.start_time)
+            self.file.write(MAGIC)
+            self.file.write(struct.pack('<HH', RECORD_SIZE, self.period))
+        except OSError as e: self._fail(e)
+        self._index = 0   # records logged
+        self._flushed = 0 # records written to flash
+        self._last = None
+        self.events = 0
+        for i in range(4): self.on_time[i] = 0
+        self.dropped = 0
+
+    def event(self, ev, width=0):
+        # a pulse of width ms started, a negative width cuts one short
+        if width >= 0: self.events |= ev
+        self.on_time[_ACTUATOR[ev]] += width
+
+    def log(self, ref, act, distance):
+        if self.file is None: return
+        now = ticks_ms()
+        if self._last is not None and not self.events and \
+           ticks_diff(now, self._last) < self.period: return
+        if self._index - self._flushed >= self._capacity:
+            self.dropped += 1
+            return
+        slot = self._index % self._capacity
+        on = self.on_time
+        struct.pack_into(RECORD, self._ring, slot * RECORD_SIZE,
+                         ticks_diff(now, self.start_time),
+                         min(int(ref * 100), 0xffff), min(int(act * 100), 0xffff),
+                         min(int(self.slope * 10000), 0xffff), max(int(distance * 10), 0), self.events,
+                         min(max(on[0], -0x7fff), 0x7fff), min(max(on[1], -0x7fff), 0x7fff),
+                         min(max(on[2], -0x7fff), 0x7fff), min(max(on[3], -0x7fff), 0x7fff))
+        self.events = 0
+        for i in range(4): on[i] = 0
+        self._last = now
+        self._index += 1
+        if self._index % self.BLOCK_RECORDS == 0:
+            if self.signal is not None:
+                self.signal.set()
+                return
+            try: micropython.schedule(self._flush_ref, 0)
+            except RuntimeError: pass # queue full: written with the next block
+
+    def _flush_cb(self, _):
+        self.flush()
+
+    def flush(self, partial=False):
+        # writes complete blocks, partial=True also the records after them
+        if self.file is None: return
+        size = self.BLOCK_RECORDS * RECORD_SIZE
+        try:
+            while self._index - self._flushed >= self.BLOCK_RECORDS:
+                start = (self._flushed % self._capacity) * RECORD_SIZE
+                self.file.write(self._mvring[start:start + size])
+                self._flushed += self.BLOCK_RECORDS
+            if partial and self._index > self._flushed:
+                start = (self._flushed % self._capacity) * RECORD_SIZE
+                self.file.write(self._mvring[start:start + (self._index - self._flushed) * RECORD_SIZE])
+                self._flushed = self._index
+            self.file.flush()
+        except OSError as e: self._fail(e)
+
+    def close(self, summary=None):
+        # summary: (average speed [km/h], distance [m], duration [s]) for the index
+        if self.file is None: return
+        self.flush(partial=True)
+        if self.file is None: return # the flush failed
+        speed, distance, duration = (0, 0, 0) if summary is None else summary
+        try: self.store.end(self.file, duration, distance, speed)
+        except OSError as e: self.error = e
+        self.file = None
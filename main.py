@@ -1,5 +1,8 @@
-from pyb import Pin, wfi, delay, hard_reset
-from time import sleep
+from pyb import Pin, hard_reset
+from micropython import const
+import sys
+try: import uasyncio as asyncio
+except ImportError: import asyncio
 
 import micropython
 micropython.alloc_emergency_exception_buf(100)
@@ -12,45 +15,133 @@ from board import Board
 from mcu import MCU
 from speed import SpeedManager
 from slope import SlopeManager
+from logger import SessionLogger
+from telemetry import Telemetry
+import calibration
 
-mcu = MCU() # blink yellow 
-spd_mngr = SpeedManager()
-slp_mngr = SlopeManager()
+# task periods [ms]
+SPEED_PERIOD = const(50)     # speed tracking
+SLOPE_PERIOD = const(200)    # slope tracking, the motor is slow
+BUTTON_PERIOD = const(100)   # start/stop button polling
+READY_PERIOD = const(1000)   # waiting for the controls to go down
+DISPLAY_FPS = Board.REFRESH_FPS
+STOPPED_WAIT = const(30)     # s before a new session can start
+# live telemetry over USB, opt-in: frames/second (0: off) and USB serial port,
+# port 0 is shared with the REPL, port 1 needs pyb.usb_mode('VCP+VCP') in boot.py
+TELEMETRY_RATE = const(0)
+TELEMETRY_PORT = const(0)
+
+mcu = MCU() # blink yellow
+calib = calibration.load() # measured step, speed gains and slope times
+logger = SessionLogger() # per second session trace
+spd_mngr = SpeedManager(calib=calib, logger=logger)
+slp_mngr = SlopeManager(calib=calib, logger=logger)
 uboard = Board(spd_mngr, slp_mngr) #user board
+if calibration.requested(): # button held while booting
+    calibration.run(spd_mngr, slp_mngr, uboard)
+    hard_reset() # boot again with the new constants
+if TELEMETRY_RATE:
+    telemetry = Telemetry(spd_mngr, slp_mngr, TELEMETRY_PORT)
+    telemetry.start(TELEMETRY_RATE) # binary frames while a host listens
+
+walking = asyncio.Event() # set while the control tasks must act
+fault = asyncio.Event() # set when a task died
+logger.signal = asyncio.Event() # a block of records is due: written by logger_task
 
-while True:
-    #making sure speed and slope leaders go down on red light
-    mcu.yellow();uboard.start() # yellow color
-    
-    while uboard.isReady() is not True: delay(1000); wfi()
-    else: mcu.green(); uboard.setReady() #green light and beep: it's safe to get onboard
-
-    # waiting for start/stop button to be pushed
-    while uboard.isOn() is not True: delay(1000); wfi()
-    else: mcu.blue(); uboard.setOn() #blue light and three beeps to state to getting started
-
-    # action is about to start    
-    spd_mngr.start()
-    #walking: control loop
-    while uboard.isOn(): # control loop remain until start/stop button is pushed
+async def speed_task():
+    while True:
+        await walking.wait()
         spd_mngr.control()
+        await asyncio.sleep_ms(SPEED_PERIOD)
+
+async def slope_task():
+    while True:
+        await walking.wait()
         slp_mngr.control()
-        uboard.running()
-    else: #stop procedure
+        await asyncio.sleep_ms(SLOPE_PERIOD)
+
+async def display_task():
+    uboard.refresh(DISPLAY_FPS, timer=False) # frames rendered here, not off Timer(1)
+    period = 1000 // DISPLAY_FPS
+    while True:
+        if walking.is_set(): uboard.data()
+        uboard.update()
+        await asyncio.sleep_ms(period)
+
+async def buzzer_task():
+    buzzer = uboard.buzzer
+    buzzer.player = True # beeps requested by the board return at once
+    while True:
+        if not buzzer.patterns:
+            await asyncio.sleep_ms(BUTTON_PERIOD)
+            continue
+        span, count, gap = buzzer.patterns.pop(0)
+        for n in range(count):
+            buzzer.pin.low()
+            await asyncio.sleep_ms(span)
+            buzzer.pin.high()
+            await asyncio.sleep_ms(gap)
+
+async def logger_task():
+    # flash writes between tasks, never inside a control() call
+    while True:
+        await logger.signal.wait()
+        logger.signal.clear()
+        logger.flush()
+
+async def session_task():
+    while True:
+        #making sure speed and slope leaders go down on red light
+        mcu.yellow();uboard.start() # yellow color
+        while uboard.isReady() is not True: await asyncio.sleep_ms(READY_PERIOD)
+        mcu.green(); uboard.setReady() #green light and beep: it's safe to get onboard
+
+        # waiting for start/stop button to be pushed
+        while uboard.isOn() is not True: await asyncio.sleep_ms(BUTTON_PERIOD)
+        mcu.blue(); uboard.setOn() #blue light and three beeps to state to getting started
+
+        # action is about to start: walking, control tasks running
+        spd_mngr.start()
+        walking.set()
+        while uboard.isOn(): await asyncio.sleep_ms(BUTTON_PERIOD) # until start/stop is pushed
+        walking.clear()
+
+        #stop procedure
         mcu.red()
         uboard.stopping() # red light and three beeps
-        spd_mngr.slow_down() # reduce speed until 2.0 km/h
-        slp_mngr.get_down()  # get down slope to horizontal level
+        slp_mngr.get_down()  # get down slope to horizontal level, moves while slowing down
+        spd_mngr.finish()
+        while spd_mngr.braking(): await asyncio.sleep_ms(SPEED_PERIOD) # reduce speed until 2.0 km/h
+        spd_mngr.close()
+        while slp_mngr.busy: await asyncio.sleep_ms(SLOPE_PERIOD)
         spd_mngr.stop()      # zero speed
-        
-    mcu.green();uboard.stopped() # green light and three long beeps
-    # getting down from machine    
-    sleep(30) # before starting new loop 30 seconds wait
-
-# just in case
-mcu.random()
-spd_mngr.stop()
-hard_reset()
-    
-
-    
+
+        mcu.green();uboard.stopped() # green light and three long beeps
+        # getting down from machine
+        await asyncio.sleep(STOPPED_WAIT) # before starting new loop
+
+def task_failed(loop, context):
+    # a dead task leaves the belt without control: stop it before anything else
+    walking.clear()
+    spd_mngr.stop()
+    slp_mngr.get_down()
+    sys.print_exception(context['exception'])
+    fault.set()
+
+async def main():
+    asyncio.get_event_loop().set_exception_handler(task_failed)
+    for task in (speed_task, slope_task, display_task, buzzer_task, logger_task, session_task):
+        asyncio.create_task(task())
+    await fault.wait()
+    # hard_reset() would release INC- at once: let the slope reach horizontal,
+    # where the position model starts after the reboot
+    while slp_mngr.busy: await asyncio.sleep_ms(SLOPE_PERIOD)
+    raise RuntimeError('task failed')
+
+try:
+    asyncio.run(main())
+except Exception as e: # just in case
+    mcu.random()
+    spd_mngr.stop()
+    sys.print_exception(e)
+    hard_reset()
@@ -0,0 +1,49 @@
+from pyb import Timer, disable_irq, enable_irq
+from time import ticks_ms, ticks_diff
+
+class Pulse(object):
+    # drives a pin on for a given time without blocking: start() returns
+    # at once and a one shot timer callback switches the pin off
+    def __init__(self, timer):
+        self._timer = Timer(timer)
+        self._end_ref = self.__end__ # bound once: no allocation in the ISR
+        self.pin = None
+        self.active = False
+        self.width = 0 # requested pulse width [ms]
+        self.start_time = 0
+        self.end_time = 0
+
+    def start(self, pin, width): # width [ms]
+        if self.active: return False
+        self.pin = pin
+        self.width = width
+        self.active = True
+        self.start_time = ticks_ms()
+        pin.on()
+        self._timer.init(freq=1000 / width)
+        self._timer.callback(self._end_ref)
+        return True
+
+    def __end__(self, tim):
+        self.pin.off()
+        tim.callback(None)
+        tim.deinit()
+        self.end_time = ticks_ms()
+        self.active = False
+
+    def cancel(self):
+        # end an in flight pulse now, returns its actual length [ms]
+        irq_state = disable_irq()
+        if self.active:
+            self._timer.callback(None)
+            self._timer.deinit()
+            self.pin.off()
+            self.end_time = ticks_ms()
+            self.active = False
+        enable_irq(irq_state)
+        return self.elapsed
+
+    @property
+    def elapsed(self): # time the pin has been (or was) on [ms]
+        end = ticks_ms() if self.active else self.end_time
+        return ticks_diff(end, self.start_time)
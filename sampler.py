@@ -0,0 +1,50 @@
+from pyb import Pin, ADC, Timer
+from array import array
+from math import fabs
+
+class ADCSampler(object):
+    # samples an ADC from a timer callback into a ring buffer, keeping a
+    # running sum so the moving average is read without waiting on the ADC.
+    # Each tick adds up `oversample` 12 bit conversions (oversampling and
+    # decimation), so values range over full_scale = 4096 * oversample.
+    def __init__(self, pin, timer, freq=100, depth=20, oversample=4):
+        if oversample > 16: raise ValueError('oversample must fit 16 bit samples')
+        self.adc = ADC(Pin(pin))
+        self.depth = depth
+        self.oversample = oversample
+        self.full_scale = 4096 * oversample
+        value = self.adc.read() * oversample
+        self._buffer = array('H', (value for i in range(depth)))
+        self._sum = value * depth
+        self._index = 0
+        self._timer = Timer(timer, freq=freq)
+        self._timer.callback(self.__callback__)
+
+    def __callback__(self, tim):
+        value = 0
+        for n in range(self.oversample):
+            value += self.adc.read()
+        i = self._index
+        self._sum += value - self._buffer[i]
+        self._buffer[i] = value
+        i += 1
+        if i == self.depth: i = 0
+        self._index = i
+
+    @property
+    def value(self): # moving average, 0..full_scale-1
+        return self._sum // self.depth
+
+    def stop(self):
+        self._timer.callback(None)
+
+class Hysteresis(object):
+    # holds a value until the input moves more than deadband away from it
+    def __init__(self, deadband):
+        self.deadband = deadband
+        self.value = None
+
+    def update(self, value):
+        if self.value is None or fabs(value - self.value) > self.deadband:
+            self.value = value
+        return self.value
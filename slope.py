@@ -1,18 +1,20 @@
-from pyb import Pin, ADC, Timer, delay
+from pyb import Pin
 from math import fabs, trunc
 from micropython import const
+from sampler import ADCSampler, Hysteresis
+from pulse import Pulse
+from logger import EV_INC_UP, EV_INC_DOWN
 
 class SlopeLeader(object):
-    def __init__(self):
-        self.adc = ADC(Pin('rINC'))
-        self._timer = Timer(7, freq=100)
-        self._buffer = bytearray(10)
+    DEADBAND = 0.02 # ratio, reference changes below it are pot noise
+    def __init__(self, deadband=DEADBAND):
+        self._sampler = ADCSampler('rINC', 7, freq=100, depth=10) # sampled in background
+        self._hysteresis = Hysteresis(deadband)
 
     def read(self):
-        self.adc.read_timed(self._buffer, self._timer) # resolution 256 
-        value = sum(self._buffer) // len(self._buffer)
-        slope = value / 256 # ratio to cover
-        return slope
+        value = self._sampler.value # resolution full_scale
+        slope = value / self._sampler.full_scale # ratio to cover
+        return self._hysteresis.update(slope)
 
     def off(self):
         #value = self.read()
@@ -21,53 +23,103 @@ class SlopeLeader(object):
 
     
 class SlopeController(object):
-    SLOPE_TMAX = const(14000) #mseconds time for the motor to cover maximum inclination range
-    N_LEVELS = const(5)
-    def __init__(self):
+    # slope position model: ratio of the range covered, moved at separate up and
+    # down motor rates once the motor start lag has elapsed
+    SLOPE_TMAX = const(14000) #mseconds time for the motor to cover maximum inclination range going up
+    SLOPE_TDOWN = const(14000) #mseconds time to cover it going down
+    LAG = const(150) #mseconds from energizing the motor to the slope moving
+    TOLERANCE = 0.03 # ratio, position error left uncorrected
+    END_MARGIN = const(500) #mseconds extra INC- to make sure horizontal end stop is reached
+    PULSE_TIMER = const(12) # ends INC+/INC- pulses
+    def __init__(self, t_up=SLOPE_TMAX, t_down=SLOPE_TDOWN, lag=LAG):
         Pin('INC+').off()
         Pin('INC-').off()
-        self._level_time = int(self.SLOPE_TMAX / self.N_LEVELS)
-        self._t_increased = 0
-        self._t_decreased = 0
-        self._slope = 0
+        self.pulse = Pulse(self.PULSE_TIMER)
+        self.t_up, self.t_down, self.lag = t_up, t_down, lag
+        self._direction = 0 # +1/-1 pulse not accounted yet
+        self._position = 0 # ratio
         self._rslope = 0
 
+    def _moved(self, elapsed, direction): # ratio covered by a pulse
+        run = elapsed - self.lag
+        if run <= 0: return 0
+        return run / (self.t_up if direction > 0 else self.t_down)
+
+    def _account(self):
+        # add the movement of a finished pulse to the position
+        if self._direction == 0 or self.pulse.active: return
+        position = self._position + self._direction * self._moved(self.pulse.elapsed, self._direction)
+        self._position = min(max(position, 0), 1)
+        self._direction = 0
+
+    @property
+    def position(self): # ratio, including a pulse in flight
+        if self._direction == 0: return self._position
+        position = self._position + self._direction * self._moved(self.pulse.elapsed, self._direction)
+        return min(max(position, 0), 1)
+
+    @property
+    def busy(self):
+        return self.pulse.active
+
+    @property
+    def reference(self): # ratio, last reference checked
+        return self._rslope
+
+    @property
+    def direction(self): # +1/-1 of a pulse not accounted yet, 0 otherwise
+        return self._direction
+
     def check(self, rslope): # ratio to cover
-        self._rslope = int(self.SLOPE_TMAX * rslope) # mseconds
-        self._slope = self._t_increased - self._t_decreased
-        #print('rslope={}, slope={}'.format(self._rslope, self._slope))
-        return False if fabs(self._rslope - self._slope) < self._level_time else True
+        self._account()
+        if self.pulse.active: return False # motor still moving
+        self._rslope = rslope
+        #print('rslope={}, slope={}'.format(self._rslope, self._position))
+        return True if fabs(self._rslope - self._position) > self.TOLERANCE else False
 
     def execute(self):
-        if self._rslope > self._slope:
-            Pin('INC+').on()
-            delay(self._level_time)
-            Pin('INC+').off()
-            self._t_increased += self._level_time
-        elif self._rslope < self._slope:
-            Pin('INC-').on()
-            delay(self._level_time)
-            Pin('INC-').off()
-            self._t_decreased += self._level_time
+        # starts the motor for the time needed to reach the reference and
+        # returns, the pulse timer stops it
+        delta = self._rslope - self._position
+        if delta > 0:
+            if self.pulse.start(Pin('INC+'), int(self.lag + delta * self.t_up)): self._direction = 1
+        elif delta < 0:
+            if self.pulse.start(Pin('INC-'), int(self.lag - delta * self.t_down)): self._direction = -1
 
     def get_down(self):
-        self._slope = self._t_increased - self._t_decreased
-        Pin('INC-').on()
-        if self._slope > 0: delay(self._slope)
-        delay(1000)
-        Pin('INC-').off()
-        self._t_decreased += self._slope
+        # runs INC- to the horizontal end stop, returns at once
+        self.pulse.cancel()
+        self._account()
+        self.pulse.start(Pin('INC-'), int(self.lag + self._position * self.t_down) + self.END_MARGIN)
+        self._position = 0 # horizontal once the pulse ends
 
     
 class SlopeManager(object):
-    def __init__(self):
+    def __init__(self, calib=None, logger=None):
+        calib = {} if calib is None else calib
         self.leader = SlopeLeader()
-        self.cntrl = SlopeController()
+        self.cntrl = SlopeController(calib.get('t_up', SlopeController.SLOPE_TMAX),
+                                     calib.get('t_down', SlopeController.SLOPE_TDOWN),
+                                     calib.get('lag', SlopeController.LAG))
+        self.logger = logger # SessionLogger, shared with SpeedManager
 
     def control(self):
         rslope = self.leader.read()
+        if self.logger is not None: self.logger.slope = rslope
         if self.cntrl.check(rslope):
             self.cntrl.execute()
+            if self.logger is not None and self.cntrl.busy:
+                self.logger.event(EV_INC_UP if self.cntrl.direction > 0 else EV_INC_DOWN,
+                                  self.cntrl.pulse.width)
 
     def get_down(self):
+        pulse = self.cntrl.pulse
+        if self.logger is not None and pulse.active: # cut short: logged with its full width
+            self.logger.event(EV_INC_UP if self.cntrl.direction > 0 else EV_INC_DOWN,
+                              pulse.elapsed - pulse.width)
         self.cntrl.get_down()
+        if self.logger is not None: self.logger.event(EV_INC_DOWN, pulse.width)
+
+    @property
+    def busy(self): # slope motor moving
+        return self.cntrl.busy
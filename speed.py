@@ -1,8 +1,11 @@
-from pyb import Pin, ADC, Timer, delay, ExtInt, disable_irq, enable_irq
+from pyb import Pin, Timer, delay, wfi, ExtInt, disable_irq, enable_irq
 from time import ticks_ms, ticks_us, ticks_diff, ticks_add
 from math import fabs, pow, trunc
 from array import array
 from micropython import const
+from sampler import ADCSampler, Hysteresis
+from pulse import Pulse
+from logger import EV_SPD_UP, EV_SPD_DOWN
 
 import micropython
 micropython.alloc_emergency_exception_buf(100)
@@ -22,16 +25,16 @@ class Speed(object):
 class SpeedLeader(object):
     M_MAX = const(20)
     SPD_MAX = const(15) # 15 km/h
-    def __init__(self):
-        self._adc = ADC(Pin('rSPD'))
-        self._timer = Timer(6, freq=100)
-        self._buffer = bytearray(self.M_MAX)
+    DEADBAND = 0.15 # km/h, reference changes below it are pot noise
+    def __init__(self, deadband=DEADBAND):
+        self._sampler = ADCSampler('rSPD', 6, freq=100, depth=self.M_MAX) # sampled in background
+        self._hysteresis = Hysteresis(deadband)
 
     @property
     def speed(self):
-        self._adc.read_timed(self._buffer, self._timer) # resolution 256
-        value = sum(self._buffer) // len(self._buffer)
-        speed = value * self.SPD_MAX / 256 #[km/h]
+        value = self._sampler.value # resolution full_scale
+        speed = value * self.SPD_MAX / self._sampler.full_scale #[km/h]
+        speed = self._hysteresis.update(speed)
         speed = trunc(speed * 10) / 10
         #print('ref speed=', speed)
         return speed
@@ -40,47 +43,175 @@ class SpeedLeader(object):
         value = self.speed
         return True if value <= 2.0 else False
 
+# Speed estimators: fed once per new pulse period [us], oldest first, they
+# keep a period estimate [us]. Integer fixed point keeps them allocation free.
+class Estimator(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.period = 0
+
+    def update(self, period):
+        self.period = period
+
+class WeightedEstimator(Estimator):
+    # weighted average of the last len(weights) periods, latest first
+    def __init__(self, weights=(0.4, 0.3, 0.2, 0.07, 0.03)):
+        self._weights = array('B', (int(w * 100 + 0.5) for w in weights)) # %
+        self._periods = array('l', (0 for w in weights))
+        super().__init__()
+
+    def reset(self):
+        self.period = 0
+        for i in range(len(self._periods)): self._periods[i] = 0
+
+    def update(self, period):
+        periods, weights = self._periods, self._weights
+        if self.period == 0: # first period: fill the history with it
+            for i in range(len(periods)): periods[i] = period
+        for i in range(len(periods)-1, 0, -1):
+            periods[i] = periods[i-1]
+        periods[0] = period
+        wsum = 0 # [us%]
+        for i in range(len(periods)):
+            wsum += weights[i] * periods[i]
+        self.period = wsum // 100
+
+class EMAEstimator(Estimator):
+    # exponential moving average, alpha in (0, 1]
+    ONE = const(128) # fixed point unit
+    def __init__(self, alpha=0.3):
+        self._alpha = int(alpha * self.ONE + 0.5)
+        super().__init__()
+
+    def update(self, period):
+        if self.period == 0: self.period = period
+        else: self.period += (period - self.period) * self._alpha // self.ONE
+
+class AlphaBetaEstimator(Estimator):
+    # alpha-beta (steady state Kalman) filter on the period and its trend per pulse
+    ONE = const(128) # fixed point unit
+    def __init__(self, alpha=0.5, beta=0.1):
+        self._alpha = int(alpha * self.ONE + 0.5)
+        self._beta = int(beta * self.ONE + 0.5)
+        super().__init__()
+
+    def reset(self):
+        self.period = 0
+        self.trend = 0 # [us/pulse]
+
+    def update(self, period):
+        if self.period == 0:
+            self.period = period
+            return
+        predicted = self.period + self.trend
+        residual = period - predicted
+        self.period = predicted + residual * self._alpha // self.ONE
+        self.trend += residual * self._beta // self.ONE
+        if self.period <= 0: # trend overshoot: restart from the measurement
+            self.period = period
+            self.trend = 0
+
 class SpeedMeter(object):
     STEP = 0.20 + 0.02 #const(6.5 * math.pi / 100) # meters - wheel circunference 2*pi*r + 2mm 
     BUFFER_SIZE = const(6)
     WEIGHTS = (0.4, 0.3, 0.2, 0.07, 0.03)
+    MAX_PERIOD = const(5000000) # useconds, longer periods mean the belt is stopped
+    CAPTURE_TIMER = const(5) # TIM5_CH1 is routed to A0 (SPD)
+    CAPTURE_PERIOD = const(0x3fffffff) # same wrap as ticks_us, so ticks_diff applies
 
-    def __init__(self):
-        self._sample_times = array('L', 0 for i in range(self.BUFFER_SIZE))
-        self.extint = ExtInt(Pin('SPD'), ExtInt.IRQ_FALLING, Pin.PULL_UP, self.__callback__)
+    def __init__(self, depth=BUFFER_SIZE, estimator=None, capture=False, step=STEP):
+        if depth < 2: raise ValueError('depth must be at least 2')
+        self.step = step # meters per pulse, calibrated or STEP
+        self.depth = depth
+        self._sample_times = array('L', (0 for i in range(depth))) # ring buffer of pulse times [us]
+        self._head = 0 # index of the latest pulse time
+        self._periods = array('l', (0 for i in range(depth - 1))) # new periods, latest first
+        self.estimator = WeightedEstimator(self.WEIGHTS) if estimator is None else estimator
+        self._k = self.step * 3.6 * pow(10, 6) # [m/us] -> km/h
+        self._speed = 0
+        self._speed_period = 0 # period the cached speed belongs to
+        self._speed_count = 0 # counter value already fed to the estimator
+        self.capture = capture
+        if capture: # pulse edges latched by timer input capture at 1 us resolution
+            self.timer = Timer(self.CAPTURE_TIMER)
+            self.timer.init(prescaler=self.timer.source_freq() // 1000000 - 1, period=self.CAPTURE_PERIOD)
+            self._channel = self.timer.channel(1, Timer.IC, pin=Pin('SPD'), polarity=Timer.FALLING,
+                                               callback=self.__capture__)
+            Pin('SPD').init(Pin.AF_PP, Pin.PULL_UP, af=Pin.AF2_TIM5)
+            self._now = self.timer.counter
+        else: # pulse edges timestamped by ExtInt handler
+            self.extint = ExtInt(Pin('SPD'), ExtInt.IRQ_FALLING, Pin.PULL_UP, self.__callback__)
+            self._now = ticks_us
         self.reset()
         
     def reset(self):
         self.counter = 0
+        self._speed_count = 0
+        self.estimator.reset()
         self.end_counter = None
         self.start_time = ticks_ms()
         self.end_time = None
 
     def __callback__(self, line):
         self.counter += 1
-        for i in range(self.BUFFER_SIZE-1, 0, -1):
-            self._sample_times[i]=self._sample_times[i-1]
-        else: self._sample_times[0] = ticks_ms()
+        head = self._head + 1
+        if head == self.depth: head = 0
+        self._sample_times[head] = ticks_us()
+        self._head = head
+
+    def __capture__(self, tim):
+        self.counter += 1
+        head = self._head + 1
+        if head == self.depth: head = 0
+        self._sample_times[head] = self._channel.capture()
+        self._head = head
 
     @property
     def distance(self): #meters
         irq_state = disable_irq()
-        value = (self.counter - 1) * self.STEP
+        value = (self.counter - 1) * self.step
         enable_irq(irq_state)
         return value
     @property
     def duration(self): # seconds
         return ticks_diff(ticks_ms(), self.start_time) * pow(10, -3)
 
+    def set_estimator(self, estimator):
+        self.estimator = estimator
+        estimator.reset()
+
     @property
-    def speed(self): #meters/second
+    def speed(self): # km/h, without heap allocation unless the estimate changed
         irq_state = disable_irq()
-        periods = [ticks_diff(self._sample_times[i], self._sample_times[i+1]) \
-                   for i in range(self.BUFFER_SIZE-1)]
+        counter = self.counter
+        times, head, depth, periods = self._sample_times, self._head, self.depth, self._periods
+        last = times[head]
+        # periods between pulses of this session only: the ring still holds
+        # times of the previous one after reset()
+        new = min(counter - self._speed_count, counter - 1, len(periods))
+        for i in range(new): # latest first
+            j = head - i
+            if j < 0: j += depth
+            k = j - 1
+            if k < 0: k += depth
+            periods[i] = ticks_diff(times[j], times[k])
+        self._speed_count = counter # claimed here: a scheduled caller won't feed them again
         enable_irq(irq_state)
-        period = sum([x*y for x,y in zip(self.WEIGHTS, periods)]) * pow(10,-3) #seconds
-        speed = self.STEP / period if period > 0 else 0 # meters/second
-        return speed * 3.6 # m/s -> km/h
+        for i in range(new - 1, -1, -1): # oldest first
+            period = periods[i]
+            if period >= self.MAX_PERIOD or period <= 0:
+                self.estimator.reset() # belt was stopped: start estimating afresh
+            else: self.estimator.update(period)
+        period = self.estimator.period
+        if period > 0: # no estimate yet reads 0, not a decay from the last pulse
+            elapsed = ticks_diff(self._now(), last)
+            if elapsed > period: period = elapsed # no pulse for longer than expected: decay
+        if period != self._speed_period:
+            self._speed_period = period
+            self._speed = self._k / period if 0 < period < self.MAX_PERIOD else 0
+        return self._speed
     
     def finish(self):
         self.end_time = ticks_ms()
@@ -92,7 +223,7 @@ class SpeedMeter(object):
     
     @property
     def sm_data(self): #summary data
-        distance =  (self.end_counter - 1) * self.STEP #meters
+        distance =  (self.end_counter - 1) * self.step #meters
         duration =  ticks_diff(self.end_time, self.start_time) * pow(10,-3) #seconds
         speed =  (distance / duration) * 3.6 # m/s -> km/h
         return speed, distance, duration
@@ -100,73 +231,162 @@ class SpeedMeter(object):
 class SpeedController(object):
     IW_LAPSE = const(1000) # increasing speed waiting lapse
     DW_LAPSE = const(300)  # decreasing speed waiting lapse
+    PULSE_TIME = const(1000) # SPD+/SPD- pulse width
+    PULSE_TIMER = const(4) # ends SPD+/SPD- pulses
+    BANG = const(0) # control mode: fixed pulses
+    PI = const(1)   # control mode: proportional-integral pulse width
+    KP = 600 # PI pulse width per speed error [ms/(km/h)]
+    KI = 100 # PI pulse width per integrated error [ms/(km/h*s)]
+    MIN_PULSE = const(100)  # PI pulse width limits [ms]
+    MAX_PULSE = const(3000)
+    MIN_LAPSE = const(200)  # PI waiting lapse lower limit [ms]
+    I_MAX = 5 # integrated error limit [km/h*s]
     
-    def __init__(self):
-        self.__last_action_time = 0
+    def __init__(self, mode=BANG, kp=KP, ki=KI, gain_up=None, gain_down=None):
+        self.pulse = Pulse(self.PULSE_TIMER)
         self.__lapse = 0
+        self.mode = mode
+        self.direction = 0 # +1/-1 of the last pulse started
+        self.kp, self.ki = kp, ki
+        # measured gains [km/h per ms of SPD+/SPD-] give the proportional term
+        # that reaches the setpoint in one pulse
+        self._kp_up = 1 / gain_up if gain_up else kp
+        self._kp_down = 1 / gain_down if gain_down else kp
+        self._integral = 0 # [km/h*s]
+        self._saturated = 0 # sign of the last pulse if it hit MAX_PULSE
+        self._last_check = ticks_ms()
+        self._wait = self.IW_LAPSE # PI waiting lapse after the last pulse
         Pin('SPD+').off()
         Pin('SPD-').off()
         self.speed = Speed()
         #Pin('S/W').on()
+
+    @property
+    def integral(self): # PI integrated speed error [km/h*s]
+        return self._integral
+
+    @property
+    def saturated(self): # sign of the last pulse if it hit MAX_PULSE, 0 otherwise
+        return self._saturated
+
+    def _integrate(self, delta, now):
+        dt = ticks_diff(now, self._last_check) / 1000 # seconds
+        self._last_check = now
+        # anti-windup: no integration while acting or when pushing into saturation
+        if self.pulse.active or (self._saturated and self._saturated * delta > 0): return
+        self._integral = min(max(self._integral + delta * dt, -self.I_MAX), self.I_MAX)
         
     def check(self, speed):
-        self.__lapse = ticks_diff(ticks_ms(), self.__last_action_time)
-        if self.__lapse < self.IW_LAPSE and self.__lapse < self.DW_LAPSE : return False
+        now = ticks_ms()
+        if self.mode == self.PI: self._integrate(speed.delta, now)
+        if self.pulse.active: return False # previous action still in flight
+        self.__lapse = ticks_diff(now, self.pulse.end_time)
+        if self.mode == self.PI:
+            if self.__lapse < self._wait: return False
+        elif self.__lapse < self.IW_LAPSE and self.__lapse < self.DW_LAPSE : return False
         if trunc(fabs(speed.delta)*10)/10 < 0.1: return False
         self.speed = speed
         return True
 
     def execute(self): #leader speed, measured speed
-        if self.speed.delta > 0 and self.__lapse > self.IW_LAPSE:
-            Pin('SPD+').on() # start increasing speed
-            delay(1000)
-            Pin('SPD+').off() # stop increasing speed
-            self.__last_action_time = ticks_ms()
+        # starts the pulse and returns, the pulse timer ends it
+        if self.mode == self.PI:
+            self._execute_pi()
+        elif self.speed.delta > 0 and self.__lapse > self.IW_LAPSE:
+            self.pulse.start(Pin('SPD+'), self.PULSE_TIME) # increase speed
+            self.direction = 1
         elif self.speed.delta < 0  and self.__lapse > self.DW_LAPSE:
-            Pin('SPD-').on() # start decreasing speed
-            delay(1000)
-            Pin('SPD-').off() # start decreasing speed
-            self.__last_action_time = ticks_ms()
+            self.pulse.start(Pin('SPD-'), self.PULSE_TIME) # decrease speed
+            self.direction = -1
 
-    def slow_down(self):
-        Pin('SPD-').on()
-        delay(1000)
-        Pin('SPD-').off()
-        delay(self.DW_LAPSE)
+    def _execute_pi(self):
+        delta = self.speed.delta
+        kp = self._kp_up if delta > 0 else self._kp_down
+        u = kp * delta + self.ki * self._integral # signed pulse width [ms]
+        if u == 0: return
+        width = int(min(max(fabs(u), self.MIN_PULSE), self.MAX_PULSE))
+        sign = 1 if u > 0 else -1
+        self._saturated = sign if width >= self.MAX_PULSE else 0
+        lapse = self.IW_LAPSE if sign > 0 else self.DW_LAPSE
+        # short corrections settle sooner: wait in proportion to the pulse
+        self._wait = min(lapse, max(self.MIN_LAPSE, lapse * width // self.PULSE_TIME))
+        self.pulse.start(Pin('SPD+') if sign > 0 else Pin('SPD-'), width)
+        self.direction = sign
+
+    def brake(self):
+        # one SPD- pulse once the previous one ended and DW_LAPSE elapsed,
+        # returns at once
+        if self.pulse.active or ticks_diff(ticks_ms(), self.pulse.end_time) < self.DW_LAPSE: return
+        self.pulse.start(Pin('SPD-'), self.PULSE_TIME)
+        self.direction = -1
         
     def start(self):
+        # a new session: no error integrated while idle or left from the last one
+        self._integral = 0
+        self._saturated = 0
+        self._wait = self.IW_LAPSE
+        self._last_check = ticks_ms()
         Pin('S/W').on()
         
     def stop(self):
+        self.pulse.cancel()
         Pin('S/W').off()
 
 class SpeedManager(object):
-    def __init__(self):
+    SLOW_SPEED = 2.0 # km/h, slowing down ends below it
+    def __init__(self, capture=False, mode=None, calib=None, logger=None):
+        calib = {} if calib is None else calib
+        gain_up, gain_down = calib.get('gain_up'), calib.get('gain_down')
+        if mode is None: # measured gains allow one shot PI corrections
+            mode = SpeedController.PI if gain_up and gain_down else SpeedController.BANG
         self.speed = Speed()
         self.leader = SpeedLeader()
-        self.meter = SpeedMeter()
-        self.cntrl = SpeedController()
-        self.file = open('data.csv', 'w')
+        self.meter = SpeedMeter(capture=capture, step=calib.get('step', SpeedMeter.STEP))
+        self.cntrl = SpeedController(mode, gain_up=gain_up, gain_down=gain_down)
+        self.logger = logger # SessionLogger, shared with SlopeManager
 
     def log(self):
-        self.file.write('{0:.1f},{1:.1f},{2:.1f}\n'.format(self.meter.duration, self.speed.ref, self.speed.act))    
+        if self.logger is None: return
+        self.logger.log(self.speed.ref, self.speed.act, self.meter.distance)
 
     def start(self):
         self.meter.reset()
+        if self.logger is not None: self.logger.start()
         self.cntrl.start()
         
     def control(self):
         self.speed.ref = self.leader.speed #get reference speed
         self.speed.act = self.meter.speed  #get actual speed
-        #self.log()
         if self.cntrl.check(self.speed): # check speed difference
             self.cntrl.execute() # take action to reduce speed difference
+            if self.logger is not None and self.cntrl.pulse.active:
+                self.logger.event(EV_SPD_UP if self.cntrl.direction > 0 else EV_SPD_DOWN,
+                                  self.cntrl.pulse.width)
+        self.log()
 
-    def slow_down(self):
+    def finish(self):
         self.meter.finish()
-        while self.meter.speed > 2.0:
-            self.cntrl.slow_down()
-        self.file.close()
+
+    def braking(self):
+        # True while above SLOW_SPEED, with SPD- pulses started one at a time
+        self.speed.act = self.meter.speed
+        if self.speed.act <= self.SLOW_SPEED: return False
+        idle = not self.cntrl.pulse.active
+        self.cntrl.brake()
+        if self.logger is not None and idle and self.cntrl.pulse.active:
+            self.logger.event(EV_SPD_DOWN, self.cntrl.pulse.width)
+        self.log()
+        return True
+
+    def close(self):
+        if self.logger is None: return
+        self.log() # pulses started since the last record
+        self.logger.close(self.meter.sm_data)
+
+    def slow_down(self):
+        self.finish()
+        while self.braking(): wfi()
+        self.close()
 
     def stop(self):
         self.cntrl.stop()
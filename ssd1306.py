@@ -32,11 +32,82 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self._mvbuf = memoryview(self.buffer)
+        # column span touched on each page since the last transfer, x0 > x1 means clean
+        self._dirty_x0 = bytearray(self.width for _ in range(self.pages))
+        self._dirty_x1 = bytearray(self.pages)
+        # window commands of show(), filled in place for every transfer
+        self._window = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        # mark a rectangle as modified so next show() transfers it
+        w = self.width if w is None else w
+        h = self.height if h is None else h
+        x0 = max(x, 0)
+        x1 = min(x + w, self.width) - 1
+        y0 = max(y, 0)
+        y1 = min(y + h, self.height) - 1
+        if x0 > x1 or y0 > y1: return
+        for page in range(y0 >> 3, (y1 >> 3) + 1):
+            if x0 < self._dirty_x0[page]: self._dirty_x0[page] = x0
+            if x1 > self._dirty_x1[page]: self._dirty_x1[page] = x1
+
+    def _clean(self):
+        for page in range(self.pages):
+            self._dirty_x0[page] = self.width
+            self._dirty_x1[page] = 0
+
+    # drawing primitives record the area they touch before drawing
+    def fill(self, c):
+        self.invalidate()
+        super().fill(c)
+
+    def pixel(self, x, y, c=None):
+        if c is None: return super().pixel(x, y)
+        self.invalidate(x, y, 1, 1)
+        super().pixel(x, y, c)
+
+    def hline(self, x, y, w, c):
+        self.invalidate(x, y, w, 1)
+        super().hline(x, y, w, c)
+
+    def vline(self, x, y, h, c):
+        self.invalidate(x, y, 1, h)
+        super().vline(x, y, h, c)
+
+    def line(self, x0, y0, x1, y1, c):
+        self.invalidate(min(x0, x1), min(y0, y1), abs(x1 - x0) + 1, abs(y1 - y0) + 1)
+        super().line(x0, y0, x1, y1, c)
+
+    def rect(self, x, y, w, h, c):
+        self.invalidate(x, y, w, h)
+        super().rect(x, y, w, h, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        self.invalidate(x, y, w, h)
+        super().fill_rect(x, y, w, h, c)
+
+    def text(self, s, x, y, c=1):
+        self.invalidate(x, y, 8 * len(s), 8)
+        super().text(s, x, y, c)
+
+    def scroll(self, xstep, ystep):
+        self.invalidate()
+        super().scroll(xstep, ystep)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        # sources exposing width/height (e.g. writer glyphs) limit the dirty area,
+        # any other framebuffer marks everything from (x, y) on
+        w = getattr(fbuf, 'width', self.width - x)
+        h = getattr(fbuf, 'height', self.height - y)
+        self.invalidate(x, y, w, h)
+        if palette is None: super().blit(fbuf, x, y, key)
+        else: super().blit(fbuf, x, y, key, palette)
+
     def init_display(self):
-        for cmd in (
+        self.write_cmds(bytes((
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR,
@@ -66,9 +137,8 @@ class SSD1306(framebuf.FrameBuffer):
             # charge pump
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01,  # on
+        )))
         self.fill(0)
         self.show()
 
@@ -79,26 +149,47 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_DISP | 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.write_cmds(bytes((SET_CONTRAST, contrast)))
 
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+    def _transfer(self, x0, x1, page0, page1, data):
+        # displays with width of 64 pixels are shifted by 32
+        shift = 32 if self.width == 64 else 0
+        window = self._window
+        window[1] = x0 + shift
+        window[2] = x1 + shift
+        window[4] = page0
+        window[5] = page1
+        self.write_cmds(window)
+        self.write_data(data)
+
+    def show(self, full=False):
+        # send only the pages (and column span within each page) modified
+        # since the last call; full=True pushes the whole buffer
+        width = self.width
+        if full:
+            self._transfer(0, width - 1, 0, self.pages - 1, self.buffer)
+            self._clean()
+            return
+        x0s, x1s = self._dirty_x0, self._dirty_x1
+        page = 0
+        while page < self.pages:
+            x0, x1 = x0s[page], x1s[page]
+            if x0 > x1: page += 1; continue
+            if x0 == 0 and x1 == width - 1:
+                # consecutive full-width pages are contiguous in the buffer: one transfer
+                last = page
+                while last + 1 < self.pages and x0s[last + 1] == 0 and x1s[last + 1] == width - 1:
+                    last += 1
+                self._transfer(0, width - 1, page, last, self._mvbuf[page * width:(last + 1) * width])
+                page = last + 1
+            else:
+                start = page * width
+                self._transfer(x0, x1, page, page, self._mvbuf[start + x0:start + x1 + 1])
+                page += 1
+        self._clean()
 
 class SSD1306_I2C(SSD1306):
     def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
@@ -106,6 +197,7 @@ class SSD1306_I2C(SSD1306):
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        self.cmd_list = [b"\x00", None]  # Co=0, D/C#=0
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
@@ -113,6 +205,11 @@ class SSD1306_I2C(SSD1306):
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        # whole command sequence in a single transaction
+        self.cmd_list[1] = cmds
+        self.i2c.writevto(self.addr, self.cmd_list)
+
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
@@ -125,6 +222,8 @@ class SSD1306_SPI(SSD1306):
         res.init(res.OUT, value=0)
         cs.init(cs.OUT, value=1)
         self.spi = spi
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cmd = bytearray(1)
         self.dc = dc
         self.res = res
         self.cs = cs
@@ -138,15 +237,17 @@ class SSD1306_SPI(SSD1306):
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cmd[0] = cmd
+        self.write_cmds(self.cmd)
+
+    def write_cmds(self, cmds):
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(cmds)
         self.cs(1)
 
     def write_data(self, buf):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
         self.dc(1)
         self.cs(0)
@@ -0,0 +1,96 @@
+from pyb import Timer, USB_VCP
+from time import ticks_ms
+from micropython import const
+import micropython
+import struct
+try: from ubinascii import crc32
+except ImportError: from binascii import crc32
+
+# Live telemetry: fixed size binary frames sent over a USB serial port
+# (CDC) at a fixed rate, only while a host has the port open and never
+# waiting for it. host/telemetry.py receives them. Port 0 also carries the
+# REPL: with pyb.usb_mode('VCP+VCP') in boot.py, port 1 keeps them apart.
+#
+# frame:  sync b'\xaa\x55', payload length B, sequence B, payload, crc32 '<I'
+#         of length, sequence and payload
+# payload '<IHHIIHHhBbbx'
+#   time      ms since boot
+#   act, ref  actual and reference speed [km/h * 100]
+#   distance  [m * 10]
+#   duration  ms since the session start
+#   rslope    slope reference [ratio * 10000]
+#   slope     modelled slope position [ratio * 10000]
+#   integral  PI integrated speed error [km/h*s * 100]
+#   state     ST_* flags
+#   spd, inc  direction of the last speed pulse / slope pulse in flight
+
+SYNC = b'\xaa\x55'
+PAYLOAD = '<IHHIIHHhBbbx'
+PAYLOAD_SIZE = const(26)
+FRAME_SIZE = const(34) # sync + length + sequence + payload + crc
+ST_SPD_PULSE = const(1) # SPD+/SPD- on
+ST_INC_PULSE = const(2) # INC+/INC- on
+ST_PI = const(4) # speed controller in PI mode
+ST_SATURATED = const(8) # last PI pulse hit MAX_PULSE
+
+class Telemetry(object):
+    RATE = const(10) # frames/second
+    TIMER = const(13)
+
+    def __init__(self, spd_mngr, slp_mngr, port=0):
+        self.spd_mngr = spd_mngr
+        self.slp_mngr = slp_mngr
+        self.vcp = USB_VCP(port)
+        self._frame = bytearray(FRAME_SIZE)
+        self._frame[0:2] = SYNC
+        self._frame[2] = PAYLOAD_SIZE
+        self._mvcrc = memoryview(self._frame)[2:FRAME_SIZE - 4]
+        self._send_ref = self._send # bound once for schedule()
+        self._timer = None
+        self._pending = False
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0 # frames not (fully) accepted by the port
+
+    def start(self, rate=RATE):
+        # sends rate frames/second off a timer, rate=0 stops it
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+        if not rate: return
+        self._timer = Timer(self.TIMER, freq=rate)
+        self._timer.callback(self.callback)
+
+    def callback(self, t):
+        if self._pending: return
+        self._pending = True
+        try: micropython.schedule(self._send_ref, 0)
+        except RuntimeError: self._pending = False # schedule queue full
+
+    def pack(self):
+        spd, slp = self.spd_mngr, self.slp_mngr
+        cntrl = spd.cntrl
+        speed, distance, duration = spd.meter.rt_data
+        state = (ST_SPD_PULSE if cntrl.pulse.active else 0) | \
+                (ST_INC_PULSE if slp.busy else 0) | \
+                (ST_PI if cntrl.mode == cntrl.PI else 0) | \
+                (ST_SATURATED if cntrl.saturated else 0)
+        struct.pack_into(PAYLOAD, self._frame, 4, ticks_ms(),
+                         min(max(int(speed * 100), 0), 0xffff), min(int(spd.speed.ref * 100), 0xffff),
+                         max(int(distance * 10), 0), int(duration * 1000),
+                         min(int(slp.cntrl.reference * 10000), 0xffff),
+                         int(slp.cntrl.position * 10000),
+                         int(cntrl.integral * 100), state, cntrl.direction, slp.cntrl.direction)
+        self._frame[3] = self.seq
+        struct.pack_into('<I', self._frame, FRAME_SIZE - 4, crc32(self._mvcrc) & 0xffffffff)
+        self.seq = (self.seq + 1) & 0xff
+        return self._frame
+
+    def _send(self, _):
+        self._pending = False
+        if not self.vcp.isconnected(): return # no host: nothing built, nothing queued
+        self.send()
+
+    def send(self):
+        if self.vcp.send(self.pack(), timeout=0) == FRAME_SIZE: self.sent += 1
+        else: self.dropped += 1 # host not reading, the receiver resyncs on SYNC
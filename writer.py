@@ -42,6 +42,50 @@ class DisplayState():
         self.text_col = 0
         self.usd = False
 
+# FrameBuffer that remembers its size so devices tracking dirty areas
+# (e.g. SSD1306) can bound the region touched by a blit
+class GlyphBuffer(framebuf.FrameBuffer):
+    def __init__(self, buf, width, height, mode):
+        super().__init__(buf, width, height, mode)
+        self.width = width
+        self.height = height
+
+# Ready-to-blit glyphs of one font, shared by every Writer using it.
+# Bounded in size: when full the oldest glyph is evicted.
+class GlyphCache():
+    size = 64  # Max glyphs held per font (normal and inverted together)
+
+    def __init__(self, font, mode):
+        self.font = font
+        self.map = mode
+        self._glyphs = ({}, {})  # Indexed by invert
+        self._order = []  # (char, invert) in insertion order, for eviction
+
+    def get(self, char, invert=False):
+        glyphs = self._glyphs[1 if invert else 0]
+        fbc = glyphs.get(char)
+        if fbc is None:
+            fbc = self._build(char, invert)
+            if len(self._order) >= self.size:
+                old, oinv = self._order.pop(0)
+                del self._glyphs[oinv][old]
+            glyphs[char] = fbc
+            self._order.append((char, 1 if invert else 0))
+        return fbc
+
+    def _build(self, char, invert):
+        glyph, char_height, char_width = self.font.get_ch(char)
+        buf = bytearray(glyph)
+        if invert:
+            for i, v in enumerate(buf):
+                buf[i] = 0xFF & ~ v
+        return GlyphBuffer(buf, char_width, char_height, self.map)
+
+    def clear(self):
+        for glyphs in self._glyphs:
+            glyphs.clear()
+        self._order.clear()
+
 def _get_id(device):
     if not isinstance(device, framebuf.FrameBuffer):
         raise ValueError('Device must be derived from FrameBuffer.')
@@ -51,6 +95,7 @@ def _get_id(device):
 class Writer():
 
     state = {}  # Holds a display state for each device
+    caches = {}  # Holds a GlyphCache for each font
 
     @staticmethod
     def set_textpos(device, row=None, col=None):
@@ -81,6 +126,11 @@ class Writer():
             self.map = framebuf.MONO_HMSB if font.reverse() else framebuf.MONO_HLSB
         else:
             raise ValueError('Font must be horizontally mapped.')
+        if font not in Writer.caches:
+            Writer.caches[font] = GlyphCache(font, self.map)
+        self.cache = Writer.caches[font]
+        # Fonts with a precomputed width table measure text without get_ch
+        self._width = font.width if hasattr(font, 'width') else lambda ch: font.get_ch(ch)[2]
         if verbose:
             fstr = 'Orientation: Horizontal. Reversal: {}. Width: {}. Height: {}.'
             print(fstr.format(font.reverse(), device.width, device.height))
@@ -149,23 +199,44 @@ class Writer():
                 self._printchar('\n')
                 string = lines[1]
 
+    # Single pass word wrap: each char is measured once and lines are
+    # printed from index ranges of string, without slicing. Breaks at the
+    # last run of spaces that fits; a line starting with a word wider than
+    # the screen is not wrapped.
     def _printline(self, string, invert):
-        rstr = None
-        if self.wrap and self.stringlen(string) > self.screenwidth:
-            pos = 0
-            lstr = string[:]
-            while self.stringlen(lstr) > self.screenwidth:
-                pos = lstr.rfind(' ')
-                lstr = lstr[:pos].rstrip()
-            if pos > 0:
-                rstr = string[pos + 1:]
-                string = lstr
-                
-        for char in string:
-            self._printchar(char, invert)
-        if rstr is not None:
-            self._printchar('\n')
-            self._printline(rstr, invert)  # Recurse
+        start = 0
+        end = len(string)
+        if self.wrap:
+            width = 0  # Width of string[start:i + 1]
+            brk = -1  # Index of last space seen
+            wbrk = 0  # Width up to and including that space
+            i = 0
+            while i < end:
+                char = string[i]
+                width += self._charlen(char)
+                if char == ' ':
+                    brk, wbrk = i, width
+                if width > self.screenwidth:
+                    rbrk = brk  # Resume after the whole run of spaces
+                    while rbrk + 1 < end and string[rbrk + 1] == ' ':
+                        rbrk += 1
+                    if rbrk <= start:
+                        break
+                    lend = brk
+                    while lend > start and string[lend - 1] == ' ':
+                        lend -= 1
+                    for j in range(start, lend):
+                        self._printchar(string[j], invert)
+                    self._printchar('\n')
+                    start = rbrk + 1
+                    width -= wbrk
+                    if width > self.screenwidth:
+                        break
+                    if rbrk > i:
+                        i = rbrk
+                i += 1
+        for j in range(start, end):
+            self._printchar(string[j], invert)
 
     def stringlen(self, string):
         l = 0
@@ -177,7 +248,7 @@ class Writer():
         if char == '\n':
             char_width = 0
         else:
-            _, _, char_width = self.font.get_ch(char)
+            char_width = self._width(char)
         return char_width
 
     def _get_char(self, char, recurse):
@@ -231,11 +302,7 @@ class Writer():
         self._get_char(char, recurse)
         if self.glyph is None:
             return  # All done
-        buf = bytearray(self.glyph)
-        if invert:
-            for i, v in enumerate(buf):
-                buf[i] = 0xFF & ~ v
-        fbc = framebuf.FrameBuffer(buf, self.char_width, self.char_height, self.map)
+        fbc = self.cache.get(char, invert)
         self.device.blit(fbc, s.text_col, s.text_row)
         s.text_col += self.char_width
         self.cpos += 1
@@ -279,6 +346,10 @@ class CWriter(Writer):
         return self.fgcolor, self.bgcolor
 
     def _printchar(self, char, invert=False, recurse=False):
+        if not self.usd and self.fgcolor == 1 and self.bgcolor == 0:
+            # Plain monochrome: blit the cached (possibly inverted) glyph
+            super()._printchar(char, invert, recurse)
+            return
         s = self._getstate()
         self._get_char(char, recurse)
         if self.glyph is None: